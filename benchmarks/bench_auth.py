@@ -0,0 +1,183 @@
+"""Cost of the auth primitives in src/auth/utils.py, per call on one core
+
+    python -m benchmarks.bench_auth
+    python -m benchmarks.bench_auth --rounds 10 --rounds 12 --rounds 14
+
+Reports, as JSON:
+  jwt       encode / decode for HS256, HS512 and EdDSA (when cryptography is
+            installed) at several payload sizes, with the token size
+  app       create_access_token, decode_token on a cache miss and on a hit,
+            the url safe token round trip used by the email links
+  bcrypt    hash / verify per cost factor, and what the app uses today
+
+us_per_op is the best of --repeat runs, per_core_per_second is how many of
+that operation one fully busy core does, the number to budget against.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+
+import jwt
+from passlib.context import CryptContext
+
+from benchmarks import _env  # noqa: F401
+from src.auth.utils import (
+    create_access_token,
+    create_url_safe_token,
+    decode_token,
+    decode_url_safe_token,
+    generate_password_hash,
+    password_context,
+    verify_password,
+    verified_tokens,
+)
+from src.config import Config
+
+PASSWORD = "correct horse battery"
+# extra claim bytes on top of the app's usual user/exp/jti/refresh claims
+PAYLOAD_SIZES = (0, 256, 1024, 4096)
+
+
+def measure(fn, number: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return {
+        "us_per_op": round(best * 1e6, 2),
+        "per_core_per_second": round(1 / best),
+    }
+
+
+def jwt_keys() -> dict[str, tuple]:
+    """algorithm -> (signing key, verifying key)"""
+    keys = {
+        "HS256": (Config.JWT_SECRET, Config.JWT_SECRET),
+        "HS512": (Config.JWT_SECRET, Config.JWT_SECRET),
+    }
+    try:
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+            Ed25519PrivateKey,
+        )
+    except ImportError:
+        return keys
+    private_key = Ed25519PrivateKey.generate()
+    keys["EdDSA"] = (private_key, private_key.public_key())
+    return keys
+
+
+def app_payload(extra_bytes: int) -> dict:
+    payload = {
+        "user": {"email": "user@example.com", "uid": "0" * 36, "role": "user"},
+        "exp": int(time.time()) + 3600,
+        "jti": "0" * 36,
+        "refresh": False,
+    }
+    if extra_bytes:
+        payload["pad"] = "x" * extra_bytes
+    return payload
+
+
+def bench_jwt(number: int, repeat: int) -> dict:
+    report = {}
+    keys = jwt_keys()
+    for algorithm in ("HS256", "HS512", "EdDSA"):
+        if algorithm not in keys:
+            report[algorithm] = {"skipped": "pip install cryptography"}
+            continue
+        signing_key, verifying_key = keys[algorithm]
+        report[algorithm] = {}
+        for extra in PAYLOAD_SIZES:
+            payload = app_payload(extra)
+            token = jwt.encode(payload, signing_key, algorithm=algorithm)
+            report[algorithm][f"+{extra}B"] = {
+                "token_bytes": len(token),
+                "encode": measure(
+                    lambda: jwt.encode(payload, signing_key, algorithm=algorithm),
+                    number,
+                    repeat,
+                ),
+                "decode": measure(
+                    lambda: jwt.decode(token, verifying_key, algorithms=[algorithm]),
+                    number,
+                    repeat,
+                ),
+            }
+    return report
+
+
+def bench_app(number: int, repeat: int) -> dict:
+    user_data = {"email": "user@example.com", "uid": "0" * 36, "role": "user"}
+    expiry = timedelta(hours=1)
+    # a fresh token per call so every decode misses the verified token cache
+    fresh = [create_access_token(user_data, expiry) for _ in range(number * repeat)]
+    misses = iter(fresh)
+    verified_tokens.clear()
+    token = create_access_token(user_data, expiry)
+    decode_token(token)
+    url_token = create_url_safe_token({"email": "user@example.com"})
+    return {
+        "algorithm": Config.JWT_ALGORITHM,
+        "create_access_token": measure(
+            lambda: create_access_token(user_data, expiry), number, repeat
+        ),
+        "decode_token_miss": measure(
+            lambda: decode_token(next(misses)), number, repeat
+        ),
+        "decode_token_hit": measure(lambda: decode_token(token), number, repeat),
+        "create_url_safe_token": measure(
+            lambda: create_url_safe_token({"email": "user@example.com"}),
+            number,
+            repeat,
+        ),
+        "decode_url_safe_token": measure(
+            lambda: decode_url_safe_token(url_token), number, repeat
+        ),
+    }
+
+
+def bench_bcrypt(rounds: list[int], number: int, repeat: int) -> dict:
+    current = generate_password_hash(PASSWORD)
+    report = {
+        "app": {
+            "rounds": password_context.handler("bcrypt").default_rounds,
+            "hash": measure(lambda: generate_password_hash(PASSWORD), number, repeat),
+            "verify": measure(
+                lambda: verify_password(PASSWORD, current), number, repeat
+            ),
+        }
+    }
+    for cost in rounds:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=cost)
+        hashed = context.hash(PASSWORD)
+        report[f"rounds_{cost}"] = {
+            "hash": measure(lambda: context.hash(PASSWORD), number, repeat),
+            "verify": measure(lambda: context.verify(PASSWORD, hashed), number, repeat),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="calls per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--bcrypt-number", type=int, default=5)
+    parser.add_argument("--bcrypt-repeat", type=int, default=3)
+    parser.add_argument("--rounds", type=int, action="append")
+    args = parser.parse_args()
+
+    report = {
+        "jwt": bench_jwt(args.number, args.repeat),
+        "app": bench_app(args.number, args.repeat),
+        "bcrypt": bench_bcrypt(
+            args.rounds or [10, 11, 12, 13], args.bcrypt_number, args.bcrypt_repeat
+        ),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
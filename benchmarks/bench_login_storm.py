@@ -0,0 +1,112 @@
+"""Latency of an unrelated GET endpoint while logins hash passwords
+
+    python -m benchmarks.bench_login_storm --logins 200 --concurrency 20
+
+Runs a small app in-process with a /ping route and two login routes, one that
+calls bcrypt on the event loop (the old /login) and one that goes through the
+PasswordHasher executor (the current /login). For each, a storm of logins runs
+while /ping is probed every PING_INTERVAL, the p50/p99 of /ping (measured from
+when each probe was due) and the login outcomes are reported.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks import _env  # noqa: F401
+from src.auth.utils import (
+    generate_password_hash,
+    verify_password,
+    verify_password_async,
+)
+from src.errors import register_all_errors
+
+PASSWORD = "correct horse battery"
+HASH = generate_password_hash(PASSWORD)
+PING_INTERVAL = 0.005
+
+app = FastAPI()
+register_all_errors(app)
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+@app.post("/login_blocking")
+async def login_blocking():
+    return {"valid": verify_password(PASSWORD, HASH)}
+
+
+@app.post("/login")
+async def login():
+    return {"valid": await verify_password_async(PASSWORD, HASH)}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct), len(samples) - 1)]
+
+
+async def storm(path: str, logins: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    async with client:
+        statuses: dict[int, int] = {}
+        queue = iter(range(logins))
+        done = asyncio.Event()
+
+        async def login_worker():
+            for _ in queue:
+                status = (await client.post(path)).status_code
+                statuses[status] = statuses.get(status, 0) + 1
+
+        async def pinger() -> list[float]:
+            # probes run on a fixed schedule and are timed from when they were
+            # due, not from when they were sent: a blocked loop delays the
+            # wake up itself, timing from the send would hide exactly that
+            latencies = []
+            scheduled = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+                await client.get("/ping")
+                latencies.append((time.perf_counter() - scheduled) * 1000)
+                scheduled += PING_INTERVAL
+            return latencies
+
+        ping_task = asyncio.create_task(pinger())
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        latencies = await ping_task
+
+    return {
+        "login_statuses": statuses,
+        "logins_per_second": round(logins / elapsed, 1),
+        "ping_count": len(latencies),
+        "ping_p50_ms": round(statistics.median(latencies), 2),
+        "ping_p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    report = {
+        "blocking": await storm("/login_blocking", args.logins, args.concurrency),
+        "executor": await storm("/login", args.logins, args.concurrency),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
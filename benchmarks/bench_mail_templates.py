@@ -0,0 +1,88 @@
+"""Per message cost of rendering mail bodies, at campaign scale
+
+    python -m benchmarks.bench_mail_templates --messages 100000
+
+Renders the verify email for --messages distinct recipients four ways:
+  fstring     the inline f-string html the routes used to build (no text part)
+  uncached    a new jinja Environment per message, what FastMail does when it
+              is given a template_name
+  compiled    mail_templates.render, templates compiled once at import,
+              html and plain text
+  compiled_mime   the same plus building the multipart EmailMessage the
+              celery worker hands to SMTP
+
+and reports us per message, messages per second on one core and how long
+the rendering of the whole campaign takes.
+"""
+import argparse
+import json
+import time
+
+from jinja2 import Environment, FileSystemLoader
+
+from benchmarks import _env  # noqa: F401
+from src.mail import TEMPLATE_DIR, mail_templates
+from src.smtp_pool import build_message
+
+
+def fstring(link: str, first_name: str) -> str:
+    return f"""
+    <h1>Verify Email</h1>
+    <p>Please click this <a href=f"{link}">Link</a> to verify it's you</p>
+
+    """
+
+
+def uncached(link: str, first_name: str) -> str:
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
+    return env.get_template("verify_email.html").render(
+        link=link, first_name=first_name
+    )
+
+
+def compiled(link: str, first_name: str) -> tuple[str, str, str]:
+    return mail_templates.render("verify_email", link=link, first_name=first_name)
+
+
+def compiled_mime(link: str, first_name: str):
+    subject, html, text = compiled(link, first_name)
+    return build_message(["user@example.com"], subject, html, text)
+
+
+def run(fn, messages: int) -> float:
+    start = time.perf_counter()
+    for i in range(messages):
+        fn(f"http://localhost:8000/api/v1/auth/verify/token-{i}", f"user{i}")
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument(
+        "--uncached-messages",
+        type=int,
+        default=2_000,
+        help="uncached is slow, it is timed on fewer messages and scaled",
+    )
+    args = parser.parse_args()
+
+    report = {"messages": args.messages}
+    for name, fn in (
+        ("fstring", fstring),
+        ("uncached", uncached),
+        ("compiled", compiled),
+        ("compiled_mime", compiled_mime),
+    ):
+        count = args.uncached_messages if name == "uncached" else args.messages
+        per_message = run(fn, count) / count
+        report[name] = {
+            "us_per_message": round(per_message * 1e6, 2),
+            "messages_per_second": round(1 / per_message),
+            "campaign_seconds": round(per_message * args.messages, 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Throughput of response serialization, response_model path vs the fast path
+
+    python -m benchmarks.bench_serialization --books 1000 --rounds 20
+
+    python -m benchmarks.bench_serialization --from-db
+
+Builds in-memory ORM objects shaped like the list, detail and /me responses
+(or, with --from-db, loads them from DATABASE_URL the way the routes do, so
+the values carry asyncpg's own types) and times, per payload:
+  response_model: pydantic validation from attributes, serialize, stdlib json
+                  (what FastAPI does for a returned ORM object)
+  fast:           src.serializers.ModelSerializer + orjson (FAST_JSON_RESPONSES)
+"matches" tells whether both paths produced the same JSON document.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import date, datetime
+
+from pydantic import TypeAdapter
+from sqlmodel import select
+
+from benchmarks import _env  # noqa: F401
+from src.app1.schemas import BookDetailsModel, BookPageModel
+from src.app1.service import BookService
+from src.auth.schemas import UserResponseModel
+from src.auth.service import UserauthService
+from src.db.db import async_session
+from src.db.loaders import BookLoad, UserLoad
+from src.db.models import Book, Review, User
+from src.serializers import serializer_for
+
+
+def make_book(reviews: int) -> Book:
+    now = datetime.now()
+    book = Book(
+        uid=uuid.uuid4(),
+        title="The Pragmatic Programmer",
+        author="Andrew Hunt",
+        publisher="Addison-Wesley",
+        published_date=date(1999, 10, 20),
+        page_count=352,
+        language="en",
+        user_uid=uuid.uuid4(),
+        created_at=now,
+        updated_at=now,
+        review_count=reviews,
+        rating_sum=4 * reviews,
+        rating_histogram=[0, 0, 0, 0, reviews, 0],
+    )
+    book.reviews = [
+        Review(
+            uid=uuid.uuid4(),
+            book_uid=book.uid,
+            user_uid=uuid.uuid4(),
+            review_text="Solid advice, a bit dated in places.",
+            ratings=4,
+            created_at=now,
+            updated_at=now,
+        )
+        for _ in range(reviews)
+    ]
+    return book
+
+
+def response_model_path(model, data) -> bytes:
+    adapter = TypeAdapter(model)
+    validated = adapter.validate_python(data, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def fast_path(model, data) -> bytes:
+    return serializer_for(model).dumps(data)
+
+
+def measure(fn, model, data, rounds: int) -> float:
+    fn(model, data)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(model, data)
+    return rounds / (time.perf_counter() - start)
+
+
+def in_memory_payloads(books: int) -> dict:
+    user = User(
+        uid=uuid.uuid4(),
+        username="reader",
+        email="reader@example.com",
+        password_hash="x",
+        first_name="Avid",
+        last_name="Read",
+        is_verified=True,
+        role="user",
+    )
+    user.books = [make_book(reviews=5) for _ in range(50)]
+    return {
+        "list": (
+            BookPageModel,
+            {"items": [make_book(0) for _ in range(books)], "next_cursor": "x"},
+        ),
+        "detail": (BookDetailsModel, make_book(reviews=20)),
+        "me": (UserResponseModel, user),
+    }
+
+
+async def database_payloads(books: int) -> dict:
+    """Same payloads, read through the services the routes use"""
+    async with async_session() as session:
+        page = await BookService().get_all_books(session, books)
+        if not page["items"]:
+            raise SystemExit("--from-db needs books in DATABASE_URL")
+        # the most reviewed book of the page is the detail payload
+        top = max(page["items"], key=lambda book: book.review_count)
+        detail = await BookService().get_book(top.uid, session, BookLoad.WITH_REVIEWS)
+        owner = page["items"][0].user_uid
+        email = (await session.exec(select(User.email).where(User.uid == owner))).one()
+        user = await UserauthService().get_user_by_mail(
+            email, session, UserLoad.WITH_BOOKS
+        )
+    return {
+        "list": (BookPageModel, page),
+        "detail": (BookDetailsModel, detail),
+        "me": (UserResponseModel, user),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    if args.from_db:
+        payloads = asyncio.run(database_payloads(args.books))
+    else:
+        payloads = in_memory_payloads(args.books)
+
+    report = {"source": "database" if args.from_db else "memory"}
+    for name, (model, data) in payloads.items():
+        matches = json.loads(fast_path(model, data)) == json.loads(
+            response_model_path(model, data)
+        )
+        before = measure(response_model_path, model, data, args.rounds)
+        after = measure(fast_path, model, data, args.rounds)
+        report[name] = {
+            "matches": matches,
+            "response_model_per_second": round(before, 1),
+            "fast_per_second": round(after, 1),
+            "speedup": round(after / before, 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
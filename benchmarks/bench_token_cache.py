@@ -0,0 +1,67 @@
+"""Per request auth overhead of TokenBearer before and after the verified token cache
+
+    python -m benchmarks.bench_token_cache --rps 3000 --seconds 10 --users 500
+
+Replays the token verification done for every authenticated request at the
+given rate (one second of traffic = rps requests spread over --users tokens)
+and reports the CPU time spent per request and the share of one core it takes.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+
+import jwt
+
+from benchmarks import _env  # noqa: F401
+from src.auth.utils import create_access_token, decode_token, verified_tokens
+from src.config import Config
+
+
+def decode_twice(token: str) -> dict:
+    # what TokenBearer did before: decode_token + token_valid, no cache
+    for _ in range(2):
+        token_data = jwt.decode(
+            jwt=token, key=Config.JWT_SECRET, algorithms=[Config.JWT_ALGORITHM]
+        )
+    return token_data
+
+
+def run(fn, tokens: list[str], requests: int) -> float:
+    start = time.process_time()
+    for i in range(requests):
+        fn(tokens[i % len(tokens)])
+    return time.process_time() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rps", type=int, default=3000)
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    tokens = [
+        create_access_token(
+            {"email": f"user{i}@example.com", "uid": str(i), "role": "user"},
+            expiry=timedelta(hours=1),
+        )
+        for i in range(args.users)
+    ]
+    requests = args.rps * args.seconds
+
+    verified_tokens.clear()
+    before = run(decode_twice, tokens, requests)
+    after = run(decode_token, tokens, requests)
+
+    report = {"requests": requests, "tokens": len(tokens)}
+    for name, spent in (("before", before), ("after", after)):
+        report[name] = {
+            "us_per_request": round(spent / requests * 1e6, 2),
+            "core_share_at_rps": round(spent / requests * args.rps, 4),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""Load test of the real app (src.app), every scenario against the same data
+
+    python -m benchmarks.loadtest --mode inprocess --fakeredis --reset-db
+    python -m benchmarks.loadtest --mode socket --workers 2 --duration 30
+    python -m benchmarks.loadtest --write-baseline
+
+inprocess drives the ASGI app through httpx.ASGITransport, socket starts
+uvicorn in a subprocess and goes over a real TCP connection. Both need a
+Postgres at DATABASE_URL (use a disposable database, --reset-db empties it
+and runs the migrations). Redis is REDIS_URL, or fakeredis in inprocess mode.
+
+Results are printed as JSON and compared with baseline.json next to this
+file (one entry per mode), a scenario slower than the baseline by more than
+--tolerance fails the run. The baseline only means something on the machine
+it was recorded on: record it there with --write-baseline and commit the
+updated file, a mode without an entry is reported in baseline_warning.
+"""
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+
+# fills in Settings before src is imported
+from benchmarks import _env  # noqa: F401
+from src import app
+
+from .fixtures import BenchData, reset_database, seed, use_fakeredis
+from .scenarios import SCENARIOS, Scenario
+
+BASELINE = Path(__file__).with_name("baseline.json")
+# compared against the baseline, everything else is informational
+COMPARED = {"p50_ms": "higher", "p95_ms": "higher", "rps": "lower"}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct), len(samples) - 1)]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p90_ms": round(percentile(latencies, 0.90), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    data: BenchData,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> dict:
+    """This Function used to hammer one scenario with concurrent workers
+
+    Args:
+        client (httpx.AsyncClient): in-process or socket client
+        scenario (Scenario): one iteration of the scenario
+        data (BenchData): seeded users, tokens and books
+        concurrency (int): workers running iterations back to back
+        duration (float): seconds measured
+        warmup (float): seconds run before measuring (caches, connection pool)
+
+    Returns:
+        dict: count, errors, rps and latency percentiles in ms
+    """
+    latencies: list[float] = []
+    errors = 0
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    async def worker(seed_value: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed_value)
+        while (start := time.perf_counter()) < stop_at:
+            try:
+                await scenario(client, data, rng)
+                failed = False
+            except Exception:
+                failed = True
+            if start >= measure_from:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, errors, duration)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def inprocess_client():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        yield c
+
+
+@asynccontextmanager
+async def socket_client(workers: int, concurrency: int):
+    port = free_port()
+    # the env filled in by benchmarks._env is inherited by the server
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    limits = httpx.Limits(max_connections=concurrency)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+            for _ in range(300):
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn exited before it was ready")
+                try:
+                    await client.get("/openapi.json")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("uvicorn did not start listening in 30s")
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Scenarios that got worse than the baseline by more than tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, worse_when in COMPARED.items():
+            if metric not in current or metric not in previous:
+                continue
+            old, new = previous[metric], current[metric]
+            if worse_when == "higher" and new > old * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+            elif worse_when == "lower" and new < old * (1 - tolerance):
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+        if current.get("errors", 0) > previous.get("errors", 0):
+            regressions.append(
+                f"{name}.errors: {previous.get('errors', 0)} -> {current['errors']}"
+            )
+    return regressions
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    parser.add_argument("--mode", choices=["inprocess", "socket"], default="inprocess")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="repeat to pick several, default all",
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--books-per-user", type=int, default=20)
+    parser.add_argument("--fakeredis", action="store_true")
+    parser.add_argument("--reset-db", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--write-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        if args.mode == "socket":
+            raise SystemExit("--fakeredis only works in inprocess mode")
+        use_fakeredis()
+    if args.reset_db:
+        await reset_database()
+    data = await seed(args.users, args.books_per_user)
+
+    if args.mode == "socket":
+        client_context = socket_client(args.workers, args.concurrency)
+    else:
+        client_context = inprocess_client()
+    results = {}
+    async with client_context as client:
+        for name in args.scenario or list(SCENARIOS):
+            results[name] = await run_scenario(
+                client,
+                SCENARIOS[name],
+                data,
+                args.concurrency,
+                args.duration,
+                args.warmup,
+            )
+
+    run = {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "workers": args.workers if args.mode == "socket" else None,
+        "fakeredis": args.fakeredis,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    report = {"run": run, "results": results}
+
+    # one entry per mode, a socket run is never compared with an inprocess one
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = baselines.get(args.mode)
+    if not baseline:
+        report["baseline_warning"] = (
+            f"no {args.mode} baseline in {args.baseline}, record one with "
+            "--write-baseline on the reference machine"
+        )
+    else:
+        if baseline["run"] != run:
+            report["baseline_warning"] = "recorded with different settings"
+        report["regressions"] = compare(
+            results, baseline["results"], args.tolerance
+        )
+    if args.write_baseline:
+        baselines[args.mode] = {"run": run, "results": results}
+        args.baseline.write_text(json.dumps(baselines, indent=2) + "\n")
+
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,128 @@
+import asyncio
+import sys
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from benchmarks import _env  # noqa: F401
+from src.app1.cache import book_cache
+from src.auth.cache import user_snapshots
+from src.auth.utils import create_access_token, generate_password_hash
+from src.config import Config
+from src.db import redis as redis_module
+from src.db.db import async_session, engine
+from src.db.replicas import recent_writers
+from src.db.models import Book, User
+
+PASSWORD = "bench-password"
+REPO_ROOT = Path(__file__).resolve().parents[2]
+# the app's own tokens last seconds, these outlive any run
+TOKEN_EXPIRY = timedelta(hours=12)
+
+
+@dataclass
+class BenchData:
+    emails: list[str] = field(default_factory=list)
+    tokens: list[str] = field(default_factory=list)
+    book_uids: list[str] = field(default_factory=list)
+
+
+async def reset_database() -> None:
+    """Empties the database and migrates it to head, like a fresh deployment
+
+    create_all is not enough, the search vector, review aggregates and
+    indexes come from the migrations. Refuses anything but a scratch database.
+    """
+    database = make_url(Config.DATABASE_URL).database or ""
+    if "bench" not in database and "test" not in database:
+        raise SystemExit(
+            f"--reset-db refuses database {database!r}, its name must contain "
+            "'bench' or 'test'"
+        )
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+    await engine.dispose()
+    # alembic's env.py runs its own event loop, it gets a process of its own
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "alembic", "upgrade", "head", cwd=REPO_ROOT
+    )
+    if await process.wait() != 0:
+        raise SystemExit("alembic upgrade head failed")
+
+
+async def seed(users: int, books_per_user: int) -> BenchData:
+    """This Function used to insert the users and books the scenarios use
+
+    Args:
+        users (int): verified users, all with PASSWORD
+        books_per_user (int): books owned by each of them
+
+    Returns:
+        BenchData: emails, one access token per user and the book uids
+    """
+    data = BenchData()
+    # one bcrypt for everybody, the login scenario pays for its own
+    password_hash = generate_password_hash(PASSWORD)
+    run = uuid.uuid4().hex[:8]
+    async with async_session() as session:
+        for i in range(users):
+            user = User(
+                # set here, the column default only fills it in at flush
+                uid=uuid.uuid4(),
+                username=f"bench{i}",
+                email=f"bench-{run}-{i}@example.com",
+                password_hash=password_hash,
+                first_name="bench",
+                last_name="user",
+                is_verified=True,
+                role="user",
+            )
+            session.add(user)
+            books = [
+                Book(
+                    title=f"Bench book {i}-{j}",
+                    author="Bench Author",
+                    publisher="Bench Press",
+                    published_date=date(2020, 1, 1),
+                    page_count=100 + j,
+                    language="en",
+                    user_uid=user.uid,
+                )
+                for j in range(books_per_user)
+            ]
+            session.add_all(books)
+            await session.flush()
+            data.emails.append(user.email)
+            data.tokens.append(
+                create_access_token(
+                    user_data={
+                        "email": user.email,
+                        "uid": str(user.uid),
+                        "role": user.role,
+                    },
+                    expiry=TOKEN_EXPIRY,
+                )
+            )
+            data.book_uids.extend(str(book.uid) for book in books)
+        await session.commit()
+    return data
+
+
+def use_fakeredis() -> None:
+    """Points every redis user of the app at one in-memory fakeredis"""
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError:
+        raise SystemExit("--fakeredis needs `pip install fakeredis`")
+
+    client = FakeAsyncRedis()
+    redis_module.token_blacklist = client
+    redis_module.subscriber.client = client
+    user_snapshots.client = client
+    book_cache.client = client
+    recent_writers.client = client
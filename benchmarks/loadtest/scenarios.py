@@ -0,0 +1,91 @@
+import random
+from typing import Awaitable, Callable
+
+import httpx
+
+from .fixtures import PASSWORD, BenchData
+
+API = "/api/v1"
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def check(response: httpx.Response) -> httpx.Response:
+    if response.status_code >= 400:
+        raise ScenarioError(f"{response.request.url.path} {response.status_code}")
+    return response
+
+
+def auth(data: BenchData, rng: random.Random) -> dict:
+    return {"Authorization": f"Bearer {rng.choice(data.tokens)}"}
+
+
+async def login(client: httpx.AsyncClient, data: BenchData, rng: random.Random):
+    check(
+        await client.post(
+            f"{API}/user_auth/login",
+            json={"email": rng.choice(data.emails), "password": PASSWORD},
+        )
+    )
+
+
+async def list_books(client: httpx.AsyncClient, data: BenchData, rng: random.Random):
+    check(await client.get(f"{API}/app1/", headers=auth(data, rng)))
+
+
+async def book_detail(client: httpx.AsyncClient, data: BenchData, rng: random.Random):
+    book_uid = rng.choice(data.book_uids)
+    check(await client.get(f"{API}/app1/{book_uid}", headers=auth(data, rng)))
+
+
+async def create_update_book(
+    client: httpx.AsyncClient, data: BenchData, rng: random.Random
+):
+    headers = auth(data, rng)
+    book = {
+        "title": "Load test book",
+        "author": "Bench Author",
+        "publisher": "Bench Press",
+        "page_count": 200,
+        "language": "en",
+    }
+    created = check(
+        await client.post(
+            f"{API}/app1/",
+            json={**book, "published_date": "2021-06-01"},
+            headers=headers,
+        )
+    )
+    book_uid = created.json()["uid"]
+    check(
+        await client.patch(
+            f"{API}/app1/{book_uid}",
+            json={**book, "page_count": 201},
+            headers=headers,
+        )
+    )
+
+
+async def add_review(client: httpx.AsyncClient, data: BenchData, rng: random.Random):
+    book_uid = rng.choice(data.book_uids)
+    check(
+        await client.post(
+            f"{API}/reviews/book/{book_uid}",
+            json={"review_text": "Load test review", "ratings": rng.randint(0, 5)},
+            headers=auth(data, rng),
+        )
+    )
+
+
+Scenario = Callable[[httpx.AsyncClient, BenchData, random.Random], Awaitable[None]]
+
+# create_update is two requests (POST then PATCH), timed as one iteration
+SCENARIOS: dict[str, Scenario] = {
+    "login": login,
+    "list": list_books,
+    "detail": book_detail,
+    "create_update": create_update_book,
+    "review": add_review,
+}
@@ -1,19 +1,21 @@
 # instead of doing Entry point main we can do by main project  inside __init__
 from contextlib import asynccontextmanager
 
-from debug_toolbar.middleware import (
-    DebugToolbarMiddleware,
-)
 from fastapi import FastAPI, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
 from src.app1.routs import app1_router
 from src.auth.routes import auth_router
+from src.config import Config
+from src.internal.routes import internal_router, metrics_router
 from src.reviews.routes import reviews_router
 
-from .db.db import init_db
+from .db.db import engine, init_db, replica_router
+from .db.query_budget import install_query_budget
 from .errors import register_all_errors
+from .metrics import install_metrics
 from .middleware import register_middleware
+from .profiling import install_profiler
 
 
 # starting and ending life span
@@ -38,15 +40,31 @@ app = FastAPI(
     version=version,
     debug=False,
     # lifespan=life_span,
+    default_response_class=(
+        ORJSONResponse if Config.FAST_JSON_RESPONSES else JSONResponse
+    ),
 )
 
 register_all_errors(app)
 register_middleware(app)
-app.add_middleware(
-    DebugToolbarMiddleware,
-    # panels=["debug_toolbar.panels.sqlalchemy.SQLAlchemyPanel"],
-)
+if Config.METRICS_ENABLED:
+    install_metrics(
+        app, engine, [replica.engine for replica in replica_router.replicas]
+    )
+if Config.QUERY_TRACKING_ENABLED:
+    install_query_budget(
+        app, [engine, *(replica.engine for replica in replica_router.replicas)]
+    )
+# DebugToolbarMiddleware wrapped every request in production, the profiler is
+# opt-in and not installed at all unless PROFILER_ENABLED
+if Config.PROFILER_ENABLED:
+    install_profiler(
+        app, [engine, *(replica.engine for replica in replica_router.replicas)]
+    )
 # registering router
 app.include_router(app1_router, prefix=f"/api/{version}/app1")
 app.include_router(auth_router, prefix=f"/api/{version}/user_auth")
 app.include_router(reviews_router, prefix=f"/api/{version}/reviews")
+app.include_router(internal_router, prefix=f"/api/{version}/internal")
+if Config.METRICS_ENABLED:
+    app.include_router(metrics_router)
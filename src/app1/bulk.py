@@ -0,0 +1,240 @@
+import csv
+import json
+import uuid
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from pydantic import TypeAdapter, ValidationError
+from sqlmodel.ext.asyncio.session import (
+    AsyncSession,
+)
+
+from src.config import Config
+
+from .cache import BOOK_LIST_TAG, book_cache, user_books_tag
+from .schemas import BookCreateModel
+
+BOOK_COPY_COLUMNS = [
+    "uid",
+    "title",
+    "author",
+    "publisher",
+    "published_date",
+    "page_count",
+    "language",
+    "user_uid",
+    "created_at",
+    "updated_at",
+]
+BOOK_BATCH_ADAPTER = TypeAdapter(list[BookCreateModel])
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_bytes: int | None = None
+) -> AsyncIterator[bytes | None]:
+    """Splits a byte stream into lines, only the current partial line is buffered
+
+    a line longer than max_bytes (BULK_IMPORT_MAX_LINE_BYTES) is dropped as it
+    streams in and yielded as None, so a body without newlines can not grow
+    the buffer. Lines stay bytes, they are decoded one by one in iter_rows
+    (a \n byte never occurs inside a multi byte utf-8 character).
+    """
+    max_bytes = max_bytes or Config.BULK_IMPORT_MAX_LINE_BYTES
+    parts: list[bytes] = []
+    size = 0
+    oversized = False
+    async for chunk in chunks:
+        pieces = chunk.split(b"\n")
+        for i, piece in enumerate(pieces):
+            if not oversized:
+                size += len(piece)
+                if size > max_bytes:
+                    oversized = True
+                    parts = []
+                else:
+                    parts.append(piece)
+            # every piece but the last one was ended by a newline
+            if i < len(pieces) - 1:
+                yield None if oversized else b"".join(parts)
+                parts, size, oversized = [], 0, False
+    if parts or oversized:
+        yield None if oversized else b"".join(parts)
+
+
+async def iter_rows(
+    lines: AsyncIterator[bytes | None], format: str
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """Yields (line number, row, parse error) for ndjson or csv with a header line
+
+    a csv record goes on over the next lines while it has an open quoted
+    field, it is parsed once the quotes balance (line number of its first
+    line). Undecodable and oversized lines are row errors, not request errors.
+    """
+    max_bytes = Config.BULK_IMPORT_MAX_LINE_BYTES
+    header = None
+    line_no = 0
+    # csv record spanning several lines: its lines, first line, size, quotes
+    record: list[str] = []
+    record_line = 0
+    record_size = 0
+    quotes = 0
+    async for raw in lines:
+        line_no += 1
+        if raw is None:
+            record, record_size, quotes = [], 0, 0
+            yield line_no, None, f"line longer than {max_bytes} bytes"
+            continue
+        try:
+            line = raw.decode("utf-8").rstrip("\r")
+        except UnicodeDecodeError as e:
+            record, record_size, quotes = [], 0, 0
+            yield line_no, None, f"not valid utf-8: {e.reason} at byte {e.start}"
+            continue
+        if format == "csv":
+            if not record:
+                if not line.strip():
+                    continue
+                record_line = line_no
+            record.append(line)
+            record_size += len(raw)
+            # "" escapes keep the count even, an odd count is an open field
+            quotes += line.count('"')
+            if quotes % 2:
+                if record_size > max_bytes:
+                    record, record_size, quotes = [], 0, 0
+                    yield record_line, None, f"record longer than {max_bytes} bytes"
+                continue
+            values = next(csv.reader(["\n".join(record)]))
+            record, record_size, quotes = [], 0, 0
+            if header is None:
+                header = values
+                continue
+            if len(values) != len(header):
+                error = f"expected {len(header)} columns got {len(values)}"
+                yield record_line, None, error
+                continue
+            yield record_line, dict(zip(header, values)), None
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid json: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "expected a json object"
+            continue
+        yield line_no, row, None
+    if record:
+        yield record_line, None, "unterminated quoted field"
+
+
+class BookImporter:
+    """Validates rows against BookCreateModel and COPYs them in batches
+
+    rows are validated a batch at a time, every batch is committed on its
+    own, memory holds at most one batch (of lines capped at
+    BULK_IMPORT_MAX_LINE_BYTES) and the first BULK_IMPORT_MAX_ERRORS row
+    errors whatever the upload size
+    """
+
+    def __init__(self, user_id: uuid.UUID | None, session: AsyncSession) -> None:
+        self.user_id = user_id
+        self.session = session
+        # raw rows waiting for validation, then validated COPY records
+        self.pending: list[tuple[int, dict]] = []
+        self.batch: list[tuple] = []
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def _error(self, line_no: int, errors) -> None:
+        self.failed += 1
+        if len(self.errors) < Config.BULK_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line_no, "errors": errors})
+
+    def validate_pending(self) -> None:
+        """Validates the pending raw rows in one pass and moves them to batch
+
+        the whole batch goes through one list[BookCreateModel] validation,
+        only a batch with errors pays for validating its good rows again
+        """
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        failed: dict[int, list] = {}
+        try:
+            books = BOOK_BATCH_ADAPTER.validate_python([row for _, row in rows])
+        except ValidationError as e:
+            for error in e.errors(
+                include_url=False, include_input=False, include_context=False
+            ):
+                index, *loc = error["loc"]
+                failed.setdefault(index, []).append({**error, "loc": loc})
+            books = [
+                None if i in failed else BookCreateModel.model_validate(row)
+                for i, (_, row) in enumerate(rows)
+            ]
+        for i, ((line_no, _), book) in enumerate(zip(rows, books)):
+            if i in failed:
+                self._error(line_no, failed[i])
+            else:
+                self._append(line_no, book)
+
+    def _append(self, line_no: int, book: BookCreateModel) -> None:
+        try:
+            published_date = date.fromisoformat(book.published_date)
+        except ValueError:
+            errors = [{"loc": ["published_date"], "msg": "expected YYYY-MM-DD"}]
+            self._error(line_no, errors)
+            return
+        now = datetime.now()
+        self.batch.append(
+            (
+                uuid.uuid4(),
+                book.title,
+                book.author,
+                book.publisher,
+                published_date,
+                book.page_count,
+                book.language,
+                self.user_id,
+                now,
+                now,
+            )
+        )
+
+    async def flush(self) -> None:
+        if not self.batch:
+            return
+        conn = await self.session.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "books", records=self.batch, columns=BOOK_COPY_COLUMNS
+        )
+        await self.session.commit()
+        self.inserted += len(self.batch)
+        self.batch = []
+        tags = [BOOK_LIST_TAG]
+        if self.user_id is not None:
+            tags.append(user_books_tag(self.user_id))
+        await book_cache.invalidate(tags=tags)
+
+    async def run(self, lines: AsyncIterator[bytes | None], format: str) -> dict:
+        async for line_no, row, error in iter_rows(lines, format):
+            if error is not None:
+                self._error(line_no, [{"msg": error}])
+                continue
+            self.pending.append((line_no, row))
+            if len(self.pending) >= Config.BULK_IMPORT_BATCH_SIZE:
+                self.validate_pending()
+                await self.flush()
+        self.validate_pending()
+        await self.flush()
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
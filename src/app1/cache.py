@@ -0,0 +1,243 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response, status
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError, WatchError
+from sqlmodel.ext.asyncio.session import (
+    AsyncSession,
+)
+
+from src.cache import TTLCache
+from src.config import Config
+from src.db.db import replica_router
+from src.db.redis import RedisSubscriber, subscriber, token_blacklist
+
+logger = logging.getLogger(__name__)
+
+BOOK_CACHE_CHANNEL = "book_cache"
+BOOK_LIST_TAG = "books:list"
+
+
+def book_key(book_uid) -> str:
+    return f"book:{book_uid}"
+
+
+def user_books_tag(user_uid) -> str:
+    return f"books:user:{user_uid}"
+
+
+def generation_key(name: str) -> str:
+    return f"gen:{name}"
+
+
+class ResponseCache:
+    """Serialized response bodies in redis with a small in-process tier
+
+    entries are dropped by key or by tag (a redis set of the keys filed under
+    it) and every drop is broadcast so other workers evict their local copy.
+    Every drop also stamps its time on a generation key of the key and of its
+    tags, a fill only lands when those are unchanged since before its db read,
+    so a read that started before an invalidation can not put stale data back.
+    A redis outage only costs cache misses, reads fall through to the db.
+    """
+
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        subscriber: RedisSubscriber,
+        ttl: int,
+        local_ttl: float,
+        local_size: int,
+    ) -> None:
+        self.client = client
+        self.subscriber = subscriber
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local = TTLCache(maxsize=local_size)
+        self.local_trusted = False
+        subscriber.subscribe(
+            BOOK_CACHE_CHANNEL,
+            self._on_invalidate,
+            on_sync=self._on_sync,
+            on_reset=self._on_reset,
+        )
+
+    def _on_invalidate(self, data: str) -> None:
+        for key in json.loads(data):
+            self.local.pop(key)
+
+    async def _on_sync(self) -> None:
+        self.local_trusted = True
+
+    def _on_reset(self) -> None:
+        self.local_trusted = False
+        self.local.clear()
+
+    async def get(self, key: str) -> tuple[bytes, str] | None:
+        """Returns (body, etag) or None on a miss"""
+        self.subscriber.ensure_started()
+        if self.local_trusted:
+            cached = self.local.get(key)
+            if cached is not None:
+                return cached
+        try:
+            value = await self.client.get(key)
+        except RedisError as e:
+            logger.warning("book cache read failed: %s", e)
+            return None
+        if value is None:
+            return None
+        etag, body = value.split(b"\n", 1)
+        cached = (body, etag.decode())
+        if self.local_trusted:
+            self.local.set(key, cached, time.monotonic() + self.local_ttl)
+        return cached
+
+    async def generations(self, key: str, tags: list[str] = ()) -> list | None:
+        """Generations of key and tags, take them before reading the db
+
+        None when redis is unreachable, the fill is then not cached
+        """
+        try:
+            return await self.client.mget(
+                [generation_key(name) for name in (key, *tags)]
+            )
+        except RedisError as e:
+            logger.warning("book cache read failed: %s", e)
+            return None
+
+    async def set(
+        self,
+        key: str,
+        body: bytes,
+        tags: list[str] = (),
+        generations: list | None = None,
+    ) -> str:
+        """This method used to store body under key and file it under tags
+
+        Args:
+            key (str): cache key
+            body (bytes): serialized response
+            tags (list[str]): tags the key is filed under
+            generations (list | None): what generations() returned before the
+                body was read, the body is dropped when any of them moved since
+
+        Returns:
+            str: etag of body, whether it was stored or not
+        """
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        names = [generation_key(name) for name in (key, *tags)]
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                if generations is not None:
+                    # WATCH makes the EXEC fail when an invalidate bumps a
+                    # generation between the check and the write
+                    await pipe.watch(*names)
+                    if await pipe.mget(names) != generations:
+                        return etag
+                    pipe.multi()
+                pipe.set(key, etag.encode() + b"\n" + body, ex=self.ttl)
+                for tag in tags:
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, self.ttl)
+                await pipe.execute()
+        except WatchError:
+            return etag
+        except RedisError as e:
+            logger.warning("book cache write failed: %s", e)
+            return etag
+        if self.local_trusted:
+            self.local.set(key, (body, etag), time.monotonic() + self.local_ttl)
+        return etag
+
+    async def invalidate(self, keys: list[str] = (), tags: list[str] = ()) -> None:
+        """Call after the write was committed"""
+        keys = list(keys)
+        try:
+            if tags:
+                async with self.client.pipeline(transaction=False) as pipe:
+                    for tag in tags:
+                        pipe.smembers(tag)
+                    for members in await pipe.execute():
+                        keys.extend(member.decode() for member in members)
+            async with self.client.pipeline(transaction=True) as pipe:
+                if keys or tags:
+                    pipe.delete(*keys, *tags)
+                # set even when nothing was cached, a fill may be in flight.
+                # the wall clock time, fills compare it to the replica lag
+                generation = f"{time.time():.6f}"
+                for name in (*keys, *tags):
+                    # outlives any fill, an expired one only skips a fill
+                    pipe.set(generation_key(name), generation, ex=self.ttl)
+                pipe.publish(BOOK_CACHE_CHANNEL, json.dumps(keys))
+                await pipe.execute()
+        except RedisError as e:
+            # entries left behind expire after BOOK_CACHE_TTL
+            logger.error("book cache invalidation failed: %s", e)
+        for key in keys:
+            self.local.pop(key)
+
+    async def invalidate_book(self, book_uid, owner_uid=None) -> None:
+        """Drops everything that embeds the book: its detail, list pages and owner pages"""
+        tags = [BOOK_LIST_TAG]
+        if owner_uid is not None:
+            tags.append(user_books_tag(owner_uid))
+        await self.invalidate(keys=[book_key(book_uid)], tags=tags)
+
+
+book_cache = ResponseCache(
+    token_blacklist,
+    subscriber,
+    ttl=Config.BOOK_CACHE_TTL,
+    local_ttl=Config.BOOK_CACHE_LOCAL_TTL,
+    local_size=Config.BOOK_CACHE_LOCAL_SIZE,
+)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return etag in candidates or "*" in candidates
+
+
+def invalidated_at(generations: list | None) -> float:
+    """Wall clock time of the latest invalidation in generations, 0 for none"""
+    return max((float(g) for g in generations or () if g is not None), default=0)
+
+
+async def cached_json_response(
+    request: Request,
+    session: AsyncSession,
+    key: str,
+    produce: Callable[[], Awaitable[bytes]],
+    tags: list[str] = (),
+) -> Response:
+    """Serves key from the cache, or produce() and caches it, honoring If-None-Match
+
+    a fill stays on the replica only when the last invalidation of key or its
+    tags is older than the replica lag, right after a write a lagging replica
+    would hand back the rows from before it and they would be cached for
+    BOOK_CACHE_TTL. Such a fill reads on the primary.
+    """
+    cached = await book_cache.get(key)
+    if cached is None:
+        generations = await book_cache.generations(key, tags)
+        replica = session.info.get("replica")
+        if replica is not None:
+            lag = replica_router.lag_of(replica)
+            if lag is None or time.time() - invalidated_at(generations) <= lag:
+                session.info.pop("replica")
+        body = await produce()
+        etag = await book_cache.set(key, body, tags, generations)
+    else:
+        body, etag = cached
+    headers = {"ETag": etag}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,47 @@
+"""Command line bulk import, same loader as POST /api/v1/app1/import
+
+    python -m src.app1.cli import-books books.ndjson --owner <user uid>
+    python -m src.app1.cli import-books books.csv --format csv
+"""
+import argparse
+import asyncio
+import json
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+from src.db.db import async_session
+
+from .bulk import BookImporter, iter_lines
+
+CHUNK_SIZE = 1024 * 1024
+
+
+async def read_chunks(path: Path) -> AsyncIterator[bytes]:
+    with path.open("rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def import_books(path: Path, format: str, owner: uuid.UUID | None) -> dict:
+    async with async_session() as session:
+        importer = BookImporter(owner, session)
+        return await importer.run(iter_lines(read_chunks(path)), format)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.app1.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import-books", help="bulk load books")
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    import_parser.add_argument("--owner", type=uuid.UUID, default=None)
+    args = parser.parse_args()
+
+    format = args.format or ("csv" if args.path.suffix == ".csv" else "ndjson")
+    report = asyncio.run(import_books(args.path, format, args.owner))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
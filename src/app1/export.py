@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import uuid
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from fastapi import Request
+from sqlmodel import select
+
+from src.config import Config
+from src.db.db import open_read_session
+from src.db.models import Book
+
+EXPORT_COLUMNS = [
+    Book.uid,
+    Book.title,
+    Book.author,
+    Book.publisher,
+    Book.published_date,
+    Book.page_count,
+    Book.language,
+    Book.user_uid,
+    Book.created_at,
+    Book.updated_at,
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+
+def export_statement(
+    owner: uuid.UUID | None = None,
+    language: str | None = None,
+    updated_since: datetime | None = None,
+):
+    # plain columns, not Book entities, so no review selectin per batch
+    statement = select(*EXPORT_COLUMNS)
+    if owner is not None:
+        statement = statement.where(Book.user_uid == owner)
+    if language is not None:
+        statement = statement.where(Book.language == language)
+    if updated_since is not None:
+        statement = statement.where(Book.updated_at >= updated_since)
+    return statement.execution_options(yield_per=Config.EXPORT_BATCH_SIZE)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"{type(value)} is not json serializable")
+
+
+def _encode_ndjson(rows) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), default=_json_default) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _csv_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_books(
+    statement, format: str, request: Request | None = None
+) -> AsyncIterator[bytes]:
+    """Streams the statement through a server side cursor, one batch in memory
+
+    the session is opened here and not through Depends, dependencies are
+    closed before a StreamingResponse body is sent
+    """
+    encode = _encode_csv if format == "csv" else _encode_ndjson
+    if format == "csv":
+        yield _encode_csv([EXPORT_FIELDS])
+    async with open_read_session(request) as session:
+        result = await session.stream(statement)
+        async for rows in result.partitions():
+            yield encode(rows)
@@ -0,0 +1,57 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from src.errors import InvalidCursorException
+
+
+def encode_cursor(created_at: datetime, uid: uuid.UUID) -> str:
+    """This Function used to build an opaque cursor from the last row of a page
+
+    Args:
+        created_at (datetime): created_at of the last book on the page
+        uid (uuid.UUID): uid of the last book on the page
+
+    Returns:
+        str: url safe cursor that points right after that book
+    """
+    payload = json.dumps(
+        {"c": created_at.isoformat(), "u": str(uid)}, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """This Function used to read back a cursor produced by encode_cursor
+
+    Args:
+        cursor (str): client provided cursor
+
+    Raises:
+        InvalidCursorException: cursor was tampered or is not one of ours
+
+    Returns:
+        tuple[datetime, uuid.UUID]: (created_at, uid) keyset position
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["c"]), uuid.UUID(payload["u"])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorException()
+
+
+def encode_rank_cursor(rank: float, uid: uuid.UUID) -> str:
+    """Same as encode_cursor for pages ordered by (search rank, uid)"""
+    payload = json.dumps({"r": rank, "u": str(uid)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(payload["r"]), uuid.UUID(payload["u"])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorException()
@@ -1,15 +1,32 @@
-from fastapi import APIRouter, Depends, status
+import uuid
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Query, Request, status
 from fastapi.exceptions import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
 from sqlmodel.ext.asyncio.session import (
     AsyncSession,
 )
 
+from src.app1.bulk import BookImporter, iter_lines
+from src.app1.cache import (
+    BOOK_LIST_TAG,
+    book_key,
+    cached_json_response,
+    user_books_tag,
+)
+from src.app1.export import export_statement, stream_books
 from src.app1.service import BookService
 from src.auth.dependencies import (
     AccessTokenBearer,
     RoleChecker,
 )
-from src.db.db import get_session
+from src.config import Config
+from src.db.db import get_read_session, get_session
+from src.db.loaders import BookLoad
+from src.db.query_budget import QueryBudget
+from src.serializers import serializer_for
 
 from .schemas import *
 
@@ -19,40 +36,155 @@ access_token_bearer = AccessTokenBearer()
 role_checker = RoleChecker(["admin", "user"])
 
 
+def dump_json(model: type[BaseModel], data) -> bytes:
+    if Config.FAST_JSON_RESPONSES:
+        # rows come straight from our tables, no need to validate them again
+        return serializer_for(model).dumps(data)
+    return model.model_validate(data, from_attributes=True).model_dump_json().encode()
+
+
 # all the views related app1 will be write here
-@app1_router.get("/", response_model=list[BookDetailsModel])
+@app1_router.get(
+    "/", response_model=BookPageModel, dependencies=[Depends(QueryBudget(1))]
+)
 async def get_details(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    limit: int = Query(
+        default=Config.BOOKS_PAGE_SIZE, ge=1, le=Config.BOOKS_MAX_PAGE_SIZE
+    ),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_read_session),
     user_details=Depends(access_token_bearer),
-) -> list[BookDetailsModel]:
-    book = await book_service.get_all_books(session)
-    return book
+) -> BookPageModel:
+
+    async def produce() -> bytes:
+        page = await book_service.get_all_books(session, limit, cursor)
+        return dump_json(BookPageModel, page)
+
+    key = f"books:list:{limit}:{cursor}"
+    return await cached_json_response(
+        request, session, key, produce, tags=[BOOK_LIST_TAG]
+    )
 
 
-@app1_router.get("/my_books", response_model=list[BookDetailsModel])
+@app1_router.get(
+    "/my_books",
+    response_model=BookPageModel,
+    dependencies=[Depends(QueryBudget(1))],
+)
 async def get_my_books(
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    limit: int = Query(
+        default=Config.BOOKS_PAGE_SIZE, ge=1, le=Config.BOOKS_MAX_PAGE_SIZE
+    ),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_read_session),
     user_details=Depends(access_token_bearer),
-) -> list[BookDetailsModel]:
+) -> BookPageModel:
     user_id = user_details.get("user")["uid"]
-    book = await book_service.get_won_books(user_id, session)
-    return book
+
+    async def produce() -> bytes:
+        page = await book_service.get_won_books(user_id, session, limit, cursor)
+        return dump_json(BookPageModel, page)
+
+    tag = user_books_tag(user_id)
+    key = f"{tag}:{limit}:{cursor}"
+    return await cached_json_response(request, session, key, produce, tags=[tag])
+
+
+@app1_router.post(
+    "/batch", response_model=BookBatchModel, dependencies=[Depends(QueryBudget(2))]
+)
+async def get_books_batch(
+    batch: BookBatchRequestModel,
+    session: AsyncSession = Depends(get_read_session),
+    user_details=Depends(access_token_bearer),
+):
+    """Many books in one round trip, reviews only when include_reviews is set"""
+    book_ids = list(dict.fromkeys(batch.ids))
+    if batch.include_reviews:
+        load, model = BookLoad.WITH_REVIEWS, BookDetailsModel
+    else:
+        load, model = BookLoad.MINIMAL, BookSummaryModel
+    found = await book_service.get_books_by_ids(book_ids, session, load)
+
+    books = {
+        uid: model.model_validate(found[uid], from_attributes=True)
+        if uid in found
+        else None
+        for uid in book_ids
+    }
+    result = BookBatchModel(
+        books=books, not_found=[uid for uid in book_ids if uid not in found]
+    )
+    return Response(content=result.model_dump_json(), media_type="application/json")
 
 
-@app1_router.get("/{book_id}", response_model=BookDetailsModel)
+@app1_router.get(
+    "/search", response_model=BookPageModel, dependencies=[Depends(QueryBudget(1))]
+)
+async def search_books(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(
+        default=Config.BOOKS_PAGE_SIZE, ge=1, le=Config.BOOKS_MAX_PAGE_SIZE
+    ),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_read_session),
+    user_details=Depends(access_token_bearer),
+) -> BookPageModel:
+    page = await book_service.search_books(q, session, limit, cursor)
+    return page
+
+
+@app1_router.get("/export")
+async def export_books(
+    request: Request,
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    owner: uuid.UUID | None = None,
+    language: str | None = None,
+    updated_since: datetime | None = None,
+    user_details=Depends(access_token_bearer),
+) -> StreamingResponse:
+    """Streams the catalog (without reviews), filter on updated_since for incremental pulls"""
+    statement = export_statement(owner, language, updated_since)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_books(statement, format, request), media_type=media_type
+    )
+
+
+# the book row, then its reviews in one selectin query
+@app1_router.get(
+    "/{book_id}",
+    response_model=BookDetailsModel,
+    dependencies=[Depends(QueryBudget(2))],
+)
 async def get_book(
     book_id: str,
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
     user_details=Depends(access_token_bearer),
 ):
-    get_book = await book_service.get_book(book_id, session)
-    if get_book:
-        return get_book
-    else:
+    try:
+        # canonical form, the cache key must match the one invalidated on writes
+        book_uid = uuid.UUID(book_id)
+    except ValueError:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, details="Book Not Found"
+            status_code=status.HTTP_404_NOT_FOUND, detail="Book Not Found"
         )
 
+    async def produce() -> bytes:
+        get_book = await book_service.get_book(book_uid, session)
+        if get_book is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Book Not Found"
+            )
+        return dump_json(BookDetailsModel, get_book)
+
+    return await cached_json_response(
+        request, session, book_key(book_uid), produce
+    )
+
 
 @app1_router.post(
     "/",
@@ -70,6 +202,24 @@ async def create_a_book(
     return book
 
 
+@app1_router.post("/import", dependencies=[Depends(role_checker)])
+async def import_books(
+    request: Request,
+    format: str = Query(default="ndjson", pattern="^(ndjson|csv)$"),
+    session: AsyncSession = Depends(get_session),
+    user_details=Depends(access_token_bearer),
+) -> dict:
+    """Bulk create books owned by the caller from an ndjson or csv (with header) body
+
+    the body is streamed and loaded with COPY in batches, the response lists
+    the rows that failed validation
+    """
+    user_id = uuid.UUID(user_details.get("user")["uid"])
+    importer = BookImporter(user_id, session)
+    report = await importer.run(iter_lines(request.stream()), format)
+    return report
+
+
 @app1_router.patch(
     "/{book_id}",
     response_model=Book,
@@ -1,8 +1,9 @@
 import uuid
 from datetime import date, datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, SerializeAsAny, computed_field
 
+from src.config import Config
 from src.reviews.schemas import ReviewModel
 
 # from src.auth.schemas import UserResponseModel
@@ -47,5 +48,40 @@ class BookUpdateModel(BaseModel):
 #     user: "UserResponseModel"
 
 
-class BookDetailsModel(Book):
+class BookSummaryModel(Book):
+    """Book with its rating aggregates, no review rows"""
+
+    review_count: int = 0
+    rating_sum: int = 0
+    rating_histogram: list[int] = [0] * 6
+
+    @computed_field
+    @property
+    def average_rating(self) -> float | None:
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+
+
+class BookDetailsModel(BookSummaryModel):
     reviews: list[ReviewModel] = []
+
+
+class BookPageModel(BaseModel):
+    """One keyset page of books, pass next_cursor back to get the following page"""
+
+    items: list[BookSummaryModel]
+    next_cursor: str | None = None
+
+
+class BookBatchRequestModel(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=Config.BOOKS_BATCH_MAX)
+    include_reviews: bool = False
+
+
+class BookBatchModel(BaseModel):
+    """Requested books keyed by uid, null for the ones that do not exist"""
+
+    # BookDetailsModel when reviews were requested, SerializeAsAny keeps them
+    books: dict[uuid.UUID, SerializeAsAny[BookSummaryModel] | None]
+    not_found: list[uuid.UUID]
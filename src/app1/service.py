@@ -1,13 +1,24 @@
+import re
 import uuid
 from datetime import datetime
 
-from sqlmodel import desc, select
+import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import any_, bindparam
+from sqlmodel import desc, func, select, tuple_
 from sqlmodel.ext.asyncio.session import (
     AsyncSession,
 )
 
+from src.db.loaders import BOOK_LOAD_OPTIONS, BookLoad
 from src.db.models import Book, User
 
+from .cache import book_cache
+from .pagination import (
+    decode_cursor,
+    decode_rank_cursor,
+    encode_cursor,
+    encode_rank_cursor,
+)
 from .schemas import (
     BookCreateModel,
     BookUpdateModel,
@@ -15,19 +26,85 @@ from .schemas import (
 
 
 class BookService:
-    async def get_all_books(self, session: AsyncSession):
-        statement = select(Book).order_by(desc(Book.created_at))
+    async def _paginate(
+        self, statement, limit: int, cursor: str | None, session: AsyncSession
+    ) -> dict:
+        """This method used to apply (created_at, uid) keyset pagination
+
+        Args:
+            statement: select(Book) with the filters of the caller
+            limit (int): page size
+            cursor (str | None): cursor returned with the previous page
+            session (AsyncSession): Database Session
+
+        Returns:
+            dict: books of the page and the cursor of the next one (None on last page)
+        """
+        if cursor is not None:
+            created_at, uid = decode_cursor(cursor)
+            statement = statement.where(
+                tuple_(Book.created_at, Book.uid) < tuple_(created_at, uid)
+            )
+        # one extra row tells us if there is a next page without a count(*)
+        statement = statement.order_by(desc(Book.created_at), desc(Book.uid)).limit(
+            limit + 1
+        )
         result = await session.exec(statement)
-        return result.all()
+        books = result.all()
+
+        next_cursor = None
+        if len(books) > limit:
+            books = books[:limit]
+            last = books[-1]
+            next_cursor = encode_cursor(last.created_at, last.uid)
+        return {"items": books, "next_cursor": next_cursor}
+
+    async def get_all_books(
+        self, session: AsyncSession, limit: int, cursor: str | None = None
+    ) -> dict:
+        # pages show the rating aggregates, review rows are left in the table
+        statement = select(Book).options(*BOOK_LOAD_OPTIONS[BookLoad.MINIMAL])
+        return await self._paginate(statement, limit, cursor, session)
 
-    async def get_book(self, book_id: str, session: AsyncSession):
-        statement = select(Book).where(Book.uid == book_id)
+    async def get_book(
+        self,
+        book_id: str,
+        session: AsyncSession,
+        load: BookLoad = BookLoad.WITH_REVIEWS,
+    ):
+        statement = (
+            select(Book).where(Book.uid == book_id).options(*BOOK_LOAD_OPTIONS[load])
+        )
         result = await session.exec(statement)
         book = result.first()
         if book is None:
             return None
         return book
 
+    async def get_books_by_ids(
+        self,
+        book_ids: list[uuid.UUID],
+        session: AsyncSession,
+        load: BookLoad = BookLoad.MINIMAL,
+    ) -> dict[uuid.UUID, Book]:
+        """This method used to fetch many books in one query
+
+        Args:
+            book_ids (list[uuid.UUID]): uids to fetch
+            session (AsyncSession): Database Session
+            load (BookLoad): relationships to load. Defaults to the book rows only.
+
+        Returns:
+            dict[uuid.UUID, Book]: found books by uid, missing uids are absent
+        """
+        # one array parameter (uid = ANY($1)) instead of an IN list per uid
+        ids = bindparam("book_ids", book_ids, type_=pg.ARRAY(pg.UUID))
+        statement = (
+            select(Book).where(Book.uid == any_(ids)).options(*BOOK_LOAD_OPTIONS[load])
+        )
+        result = await session.exec(statement)
+        return {book.uid: book for book in result.all()}
+
     async def create_book(
         self, book_data: BookCreateModel, user_id: uuid.UUID, session: AsyncSession
     ):
@@ -42,19 +119,21 @@ class BookService:
 
         session.add(new_book)
         await session.commit()
+        await book_cache.invalidate_book(new_book.uid, new_book.user_uid)
         return new_book
 
     async def update_book(
         self, book_id: str, book_update: BookUpdateModel, session: AsyncSession
     ):
         book_data_dict = book_update.model_dump()
-        get_book_data = await self.get_book(book_id, session)
+        get_book_data = await self.get_book(book_id, session, BookLoad.MINIMAL)
         if get_book_data is None:
             return None
 
         for k, v in book_data_dict.items():
             setattr(get_book_data, k, v)
         await session.commit()
+        await book_cache.invalidate_book(get_book_data.uid, get_book_data.user_uid)
         return get_book_data
 
     async def delete_book(self, book_id: str, session: AsyncSession):
@@ -62,14 +141,69 @@ class BookService:
         if get_book is not None:
             await session.delete(get_book)
             await session.commit()
+            await book_cache.invalidate_book(get_book.uid, get_book.user_uid)
             return True
         else:
             return None
 
-    async def get_won_books(self, user_id: str, session: AsyncSession):
+    async def get_won_books(
+        self,
+        user_id: str,
+        session: AsyncSession,
+        limit: int,
+        cursor: str | None = None,
+    ) -> dict:
 
         statement = (
-            select(Book).where(Book.user_uid == user_id).order_by(desc(Book.created_at))
+            select(Book)
+            .where(Book.user_uid == user_id)
+            .options(*BOOK_LOAD_OPTIONS[BookLoad.MINIMAL])
         )
+        return await self._paginate(statement, limit, cursor, session)
+
+    async def search_books(
+        self, q: str, session: AsyncSession, limit: int, cursor: str | None = None
+    ) -> dict:
+        """This method used to full text search title / author / publisher
+
+        every term must match, the last one as a prefix so partial input
+        (type-ahead) finds results. Pages are ordered by ts_rank then uid and
+        use a (rank, uid) keyset cursor.
+
+        Args:
+            q (str): user-provided search text
+            session (AsyncSession): Database Session
+            limit (int): page size
+            cursor (str | None): cursor returned with the previous page
+
+        Returns:
+            dict: books of the page and the cursor of the next one
+        """
+        # only word characters reach to_tsquery, its operators can't be injected
+        terms = re.findall(r"\w+", q.lower())
+        if not terms:
+            return {"items": [], "next_cursor": None}
+        query = func.to_tsquery("simple", " & ".join(terms[:-1] + [f"{terms[-1]}:*"]))
+        search_vector = Book.__table__.c.search_vector
+        rank = func.ts_rank(search_vector, query)
+
+        statement = (
+            select(Book, rank)
+            .where(search_vector.op("@@")(query))
+            .options(*BOOK_LOAD_OPTIONS[BookLoad.MINIMAL])
+        )
+        if cursor is not None:
+            last_rank, last_uid = decode_rank_cursor(cursor)
+            statement = statement.where(
+                tuple_(rank, Book.uid) < tuple_(last_rank, last_uid)
+            )
+        statement = statement.order_by(desc(rank), desc(Book.uid)).limit(limit + 1)
         result = await session.exec(statement)
-        return result.all()
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_book, last_rank = rows[-1]
+            next_cursor = encode_rank_cursor(last_rank, last_book.uid)
+        return {"items": [book for book, _ in rows], "next_cursor": next_cursor}
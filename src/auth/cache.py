@@ -0,0 +1,118 @@
+import time
+
+from redis import asyncio as aioredis
+from redis.exceptions import WatchError
+
+from src.cache import TTLCache
+from src.config import Config
+from src.db.redis import RedisSubscriber, subscriber, token_blacklist
+
+from .schemas import UserSnapshot
+
+USER_SNAPSHOT_CHANNEL = "user_snapshots"
+
+
+class UserSnapshotCache:
+    """Two tier cache of UserSnapshot keyed by email
+
+    local LRU in front of redis, invalidations are broadcast so every worker
+    drops its local copy. While the subscriber is down the local tier is
+    skipped, a worker that may miss invalidations must not trust it.
+    Invalidations also bump a per email generation, a set() carrying the
+    generation read before its db query is dropped when it moved since.
+    """
+
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        subscriber: RedisSubscriber,
+        ttl: int,
+        local_ttl: float,
+        local_size: int,
+    ) -> None:
+        self.client = client
+        self.subscriber = subscriber
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local = TTLCache(maxsize=local_size)
+        self.local_trusted = False
+        subscriber.subscribe(
+            USER_SNAPSHOT_CHANNEL,
+            self.local.pop,
+            on_sync=self._on_sync,
+            on_reset=self._on_reset,
+        )
+
+    async def _on_sync(self) -> None:
+        self.local_trusted = True
+
+    def _on_reset(self) -> None:
+        self.local_trusted = False
+        self.local.clear()
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"user_snapshot:{email}"
+
+    @staticmethod
+    def _generation_key(email: str) -> str:
+        return f"user_snapshot_gen:{email}"
+
+    async def generation(self, email: str) -> bytes | None:
+        """Read it before loading the user from the db, pass it to set()"""
+        return await self.client.get(self._generation_key(email))
+
+    async def get(self, email: str) -> UserSnapshot | None:
+        self.subscriber.ensure_started()
+        if self.local_trusted:
+            snapshot = self.local.get(email)
+            if snapshot is not None:
+                return snapshot
+        data = await self.client.get(self._key(email))
+        if data is None:
+            return None
+        snapshot = UserSnapshot.model_validate_json(data)
+        if self.local_trusted:
+            self.local.set(email, snapshot, time.monotonic() + self.local_ttl)
+        return snapshot
+
+    async def set(self, snapshot: UserSnapshot, generation: bytes | None) -> None:
+        generation_key = self._generation_key(snapshot.email)
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                # an invalidate between the check and EXEC fails the EXEC
+                await pipe.watch(generation_key)
+                if await pipe.get(generation_key) != generation:
+                    return
+                pipe.multi()
+                pipe.set(
+                    self._key(snapshot.email), snapshot.model_dump_json(), ex=self.ttl
+                )
+                await pipe.execute()
+        except WatchError:
+            return
+        if self.local_trusted:
+            self.local.set(
+                snapshot.email, snapshot, time.monotonic() + self.local_ttl
+            )
+
+    async def invalidate(self, email: str) -> None:
+        """Call after the user row was committed"""
+        self.local.pop(email)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(email))
+            pipe.incr(self._generation_key(email))
+            pipe.expire(self._generation_key(email), self.ttl)
+            pipe.publish(USER_SNAPSHOT_CHANNEL, email)
+            await pipe.execute()
+        # a set() of this worker may have filled the local tier meanwhile
+        self.local.pop(email)
+
+
+user_snapshots = UserSnapshotCache(
+    token_blacklist,
+    subscriber,
+    ttl=Config.USER_CACHE_TTL,
+    local_ttl=Config.USER_CACHE_LOCAL_TTL,
+    local_size=Config.USER_CACHE_LOCAL_SIZE,
+)
@@ -7,7 +7,6 @@ from fastapi.security.http import HTTPAuthorizationCredentials
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.db.db import get_session
-from src.db.models import User
 from src.db.redis import token_in_blacklist
 from src.errors import (
     AccessTokenRequireException,
@@ -18,6 +17,8 @@ from src.errors import (
     UserExistException,
 )
 
+from .cache import user_snapshots
+from .schemas import UserSnapshot
 from .service import UserauthService
 from .utils import decode_token
 
@@ -36,8 +37,7 @@ class TokenBearer(HTTPBearer):
         token = creds.credentials
         # getting information from token by decoded them or return None if not
         token_data = decode_token(token)
-        # so token valid return True(if) and not convert it to False and if will not execute
-        if not self.token_valid(token):
+        if token_data is None:
 
             raise InvalidTokenException()
 
@@ -61,16 +61,10 @@ class TokenBearer(HTTPBearer):
             # )
 
         self.verify_token_data(token_data)
+        # lets the session routing keep this user's reads on the primary after a write
+        request.state.token_data = token_data
         return token_data
 
-    def token_valid(self, token: str) -> bool:
-
-        token_data = decode_token(token)
-        # if token_data:
-        #     return True
-        # return False
-        return token_data is not None
-
     # def verify_token_data(self, token_data):
     #     raise NotImplementedError("Please override this methods")
 
@@ -105,10 +99,20 @@ class RefreshTokenBearer(TokenBearer):
 async def get_current_user(
     session: AsyncSession = Depends(get_session),
     token_details: dict = Depends(AccessTokenBearer()),
-):
+) -> UserSnapshot | None:
     user_email = token_details["user"]["email"]
+    # the session only opens a connection on a cache miss
+    snapshot = await user_snapshots.get(user_email)
+    if snapshot is not None:
+        return snapshot
+    # taken before the read, an invalidate that lands meanwhile voids the set
+    generation = await user_snapshots.generation(user_email)
     user = await user_service.get_user_by_mail(user_email, session)
-    return user
+    if user is None:
+        return None
+    snapshot = UserSnapshot.model_validate(user, from_attributes=True)
+    await user_snapshots.set(snapshot, generation)
+    return snapshot
 
 
 class RoleChecker:
@@ -117,7 +121,7 @@ class RoleChecker:
         self.roles = roles
 
     # used class as function invoke class() instead objects
-    def __call__(self, current_user: User = Depends(get_current_user)) -> Any:
+    def __call__(self, current_user: UserSnapshot = Depends(get_current_user)) -> Any:
 
         if not current_user.is_verified:
             # raise an Exception
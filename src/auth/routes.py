@@ -1,22 +1,31 @@
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, BackgroundTasks, Depends, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, status
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from src.app1.bulk import iter_lines
 from src.celery_task import send_mail
 from src.config import Config
-from src.db.db import get_session
+from src.db.db import get_read_session, get_session
+from src.db.loaders import UserLoad
+from src.db.query_budget import QueryBudget
 from src.db.redis import add_jit_to_blacklist
 from src.errors import UserExistException
-from src.mail import create_message, mail
+from src.mail import create_message, mail, mail_templates
+from src.mail_jobs import (
+    MAIL_JOB_MAX_LINE_BYTES,
+    get_mail_job,
+    start_mail_job,
+    stream_mail_job,
+)
+from src.serializers import serializer_for
 
 from .dependencies import (
     AccessTokenBearer,
     RefreshTokenBearer,
     RoleChecker,
-    get_current_user,
 )
 from .schemas import (
     EmailModel,
@@ -31,29 +40,57 @@ from .utils import (
     create_access_token,
     create_url_safe_token,
     decode_url_safe_token,
-    generate_password_hash,
-    verify_password,
+    generate_password_hash_async,
+    verify_password_async,
 )
 
 auth_router = APIRouter(tags=["Auth"])
 auth_service = UserauthService()
 role_checker = RoleChecker(["admin", "user"])
+admin_checker = RoleChecker(["admin"])
 
 # hours
 REFRESH_TOKEN_EXPIRE = 2
 
 
-@auth_router.post("/send_mail")
-async def send_mail(emails: EmailModel):
-    emails = emails.email_addresses
-    html = "<h1>welcome to the app</h1>"
-    subject = "welcome to our app"
-    # calling celery task
-    send_mail.delay(emails, subject, html)
-    message = create_message(recipients=emails, subject="welcome subjects", body=html)
+# named apart from the send_mail task, the route used to shadow it
+@auth_router.post(
+    "/send_mail",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admin_checker)],
+)
+async def send_bulk_mail(emails: EmailModel):
+    """Queues the mail in chunks and returns right away, poll the job for progress"""
+    subject, html, text = mail_templates.render("welcome")
+    job = await start_mail_job(emails.email_addresses, subject, html, text)
+    return {"message": "email queued", **job}
+
+
+@auth_router.post(
+    "/send_mail/stream",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admin_checker)],
+)
+async def stream_bulk_mail(request: Request):
+    """Same as /send_mail for a plain text body of one address per line
 
-    await mail.send_message(message)
-    return {"message": "email send Successfully"}
+    the body is streamed, every chunk of MAIL_JOB_CHUNK_SIZE recipients is
+    queued as soon as it is read, invalid lines are reported and skipped
+    """
+    subject, html, text = mail_templates.render("welcome")
+    lines = iter_lines(request.stream(), MAIL_JOB_MAX_LINE_BYTES)
+    job = await stream_mail_job(lines, subject, html, text)
+    return {"message": "email queued", **job}
+
+
+@auth_router.get("/send_mail/{job_id}", dependencies=[Depends(admin_checker)])
+async def get_bulk_mail_job(job_id: str):
+    job = await get_mail_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Mail Job Not Found"
+        )
+    return job
 
 
 @auth_router.post("/signup", status_code=status.HTTP_201_CREATED)
@@ -83,13 +120,11 @@ async def user_accounts(
     new_user = await auth_service.create_user(user_data, session)
     token = create_url_safe_token({"email": user_data.email})
     link = f"http://{Config.DOMAIN}/api/v1/auth/verify/{token}"
-    html_msg = f"""
-    <h1>Verify Email</h1>
-    <p>Please click this <a href=f"{link}">Link</a> to verify it's you</p>
-
-    """
+    subject, html_msg, text_msg = mail_templates.render(
+        "verify_email", link=link, first_name=user_data.first_name
+    )
     message = create_message(
-        recipients=[user_data.email], subject="Verify your Email", body=html_msg
+        recipients=[user_data.email], subject=subject, body=html_msg, text=text_msg
     )
     # used here back ground task
     # await mail.send_message(message)
@@ -141,7 +176,7 @@ async def login_users(
     # checking for user
     user = await auth_service.get_user_by_mail(email, session)
     if user:
-        password_valid = verify_password(password, user.password_hash)
+        password_valid = await verify_password_async(password, user.password_hash)
         if password_valid:
             access_token = create_access_token(
                 user_data={"email": user.email, "uid": str(user.uid), "role": user.role}
@@ -186,10 +221,23 @@ async def get_new_access_token(token_details: dict = Depends(RefreshTokenBearer(
     )
 
 
-@auth_router.get("/me", response_model=UserResponseModel)
+# user snapshot on a cache miss, the user, their books, the books' reviews
+@auth_router.get(
+    "/me", response_model=UserResponseModel, dependencies=[Depends(QueryBudget(4))]
+)
 async def get_current_user_(
-    user=Depends(get_current_user), _: bool = Depends(role_checker)
+    token_details: dict = Depends(AccessTokenBearer()),
+    session: AsyncSession = Depends(get_read_session),
+    _: bool = Depends(role_checker),
 ):
+    user_email = token_details["user"]["email"]
+    # only route that serializes the user's books, everything else stays minimal
+    user = await auth_service.get_user_by_mail(
+        user_email, session, UserLoad.WITH_BOOKS
+    )
+    if Config.FAST_JSON_RESPONSES and user is not None:
+        body = serializer_for(UserResponseModel).dumps(user)
+        return Response(content=body, media_type="application/json")
     return user
 
 
@@ -207,13 +255,11 @@ async def password_reset(email_data: PasswordResetRequestModel):
     email = email_data["email"]
     token = create_url_safe_token({"email": email})
     link = f"http://{Config.DOMAIN}/api/v1/auth/password-reset-confirm/{token}"
-    html_message = f"""
-    <h1>Reset Your Password</h1>
-    <p>Please click this <a href="{link}">link</a> to Reset Your Password</p>
-    """
-    subject = "Reset Your Password"
+    subject, html_message, text_message = mail_templates.render(
+        "password_reset", link=link
+    )
 
-    send_mail.delay([email], subject, html_message)
+    send_mail.delay([email], subject, html_message, text_message)
     return JSONResponse(
         content={
             "message": "Please check your email for instructions to reset your password",
@@ -240,12 +286,12 @@ async def reset_account_password(
     token_data = decode_url_safe_token(token)
     user_email = token_data.get("email")
     if user_email:
-        user = await auth_service.get_user_by_mail(user_email)
+        user = await auth_service.get_user_by_mail(user_email, session)
 
         if not user:
             # raise HTTPException
             pass
-        password_hash = generate_password_hash(new_password)
+        password_hash = await generate_password_hash_async(new_password)
         await auth_service.update_user(user, {"password_hash": password_hash}, session)
 
         return JSONResponse(
@@ -1,6 +1,9 @@
+import uuid
+
 from pydantic import BaseModel, EmailStr, Field
 
 from src.app1.schemas import Book, BookDetailsModel
+from src.config import Config
 
 
 class UserCreateModel(BaseModel):
@@ -20,13 +23,24 @@ class UserResponseModel(BaseModel):
     # reviews: list = [ReviewModel]
 
 
+class UserSnapshot(BaseModel):
+    """What the auth path needs from a user, cached instead of the ORM row"""
+
+    uid: uuid.UUID
+    email: str
+    role: str
+    is_verified: bool
+
+
 class UserLoginModel(BaseModel):
     email: EmailStr
     password: str = Field(min_length=6)
 
 
 class EmailModel(BaseModel):
-    email_addresses: list[EmailStr]
+    email_addresses: list[EmailStr] = Field(
+        min_length=1, max_length=Config.MAIL_JOB_MAX_RECIPIENTS
+    )
 
 
 class PasswordResetRequestModel(BaseModel):
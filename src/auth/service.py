@@ -2,26 +2,34 @@ from pydantic import EmailStr
 from sqlmodel import desc, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from src.db.loaders import USER_LOAD_OPTIONS, UserLoad
 from src.db.models import User
 
+from .cache import user_snapshots
 from .schemas import UserCreateModel
-from .utils import generate_password_hash
+from .utils import generate_password_hash_async
 
 
 class UserauthService:
     async def get_user_by_mail(
-        self, email: EmailStr, session: AsyncSession
+        self,
+        email: EmailStr,
+        session: AsyncSession,
+        load: UserLoad = UserLoad.MINIMAL,
     ) -> User | None:
         """This method used to get user by email
 
         Args:
             email (EmailStr): user-provided email
             session (AsyncSession): Database Session
+            load (UserLoad): relationships to load with the user. Defaults to the user row only.
 
         Returns:
             user | None: returns user if present i.e return None
         """
-        statement = select(User).where(User.email == email)
+        statement = (
+            select(User).where(User.email == email).options(*USER_LOAD_OPTIONS[load])
+        )
         result = await session.exec(statement)
         user = result.first()
         return user
@@ -54,14 +62,19 @@ class UserauthService:
 
         user_data_dict = user_data.model_dump()
         new_user = User(**user_data_dict)
-        new_user.password_hash = generate_password_hash(user_data_dict["password"])
+        new_user.password_hash = await generate_password_hash_async(
+            user_data_dict["password"]
+        )
         new_user.role = "user"
         session.add(new_user)
         await session.commit()
+        # drops a snapshot cached while the email did not exist yet
+        await user_snapshots.invalidate(new_user.email)
         return new_user
 
     async def update_user(self, user: User, user_data: dict, session: AsyncSession):
         for k, v in user_data.items():
             setattr(user, k, v)
         await session.commit()
+        await user_snapshots.invalidate(user.email)
         return user
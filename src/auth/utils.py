@@ -1,18 +1,28 @@
+import asyncio
+import hashlib
 import logging
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import jwt
 from itsdangerous import URLSafeTimedSerializer
 from passlib.context import CryptContext
 
+from src.cache import TTLCache
 from src.config import Config
+from src.errors import PasswordHasherBusyException
 
 password_context = CryptContext(schemes=["bcrypt"])
 
 # In Second
 ACCESS_TOKEN_EXPIRY = 5
 
+# token digest -> verified claims, an entry lives until the token's exp
+# exp is a unix timestamp so the cache runs on the wall clock
+verified_tokens = TTLCache(maxsize=Config.TOKEN_CACHE_SIZE, timer=time.time)
+
 
 def generate_password_hash(password: str) -> str:
     """This Function used create Hash of user-provided password
@@ -40,6 +50,53 @@ def verify_password(password: str, hash_password: str) -> bool:
     return password_context.verify(password, hash_password)
 
 
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a small dedicated thread pool
+
+    bcrypt releases the GIL, so hashing in threads keeps the loop free for
+    other requests. At most max_pending calls wait or run at once, past that
+    callers get PasswordHasherBusyException (503) instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self.max_pending = max_pending
+        self.pending = 0
+
+    def _release(self, future) -> None:
+        self.pending -= 1
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordHasherBusyException()
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(fn, *args)
+        self.pending += 1
+        # released when the thread is done, not when the caller gives up: a
+        # cancelled request whose hash is already running still holds a worker
+        future.add_done_callback(
+            lambda f: loop.call_soon_threadsafe(self._release, f)
+        )
+        return await asyncio.wrap_future(future)
+
+
+password_hasher = PasswordHasher(
+    workers=Config.PASSWORD_HASH_WORKERS, max_pending=Config.PASSWORD_HASH_MAX_PENDING
+)
+
+
+async def generate_password_hash_async(password: str) -> str:
+    """generate_password_hash for async code, see PasswordHasher"""
+    return await password_hasher.run(generate_password_hash, password)
+
+
+async def verify_password_async(password: str, hash_password: str) -> bool:
+    """verify_password for async code, see PasswordHasher"""
+    return await password_hasher.run(verify_password, password, hash_password)
+
+
 def create_access_token(
     user_data: dict, expiry: timedelta = None, refresh: bool = False
 ) -> str:
@@ -68,16 +125,44 @@ def create_access_token(
     return token
 
 
-def decode_token(token: str) -> dict:
+def decode_token(token: str) -> dict | None:
+    """This Function used to verify a token and return its claims
+
+    Verified claims are cached by token digest until the token expires, so a
+    token that is reused across requests is only verified once per worker.
+    Every caller gets its own copy, changing it does not touch the cache.
+    Revocation is not part of this, callers still check the blacklist.
+
+    Args:
+        token (str): encoded jwt
+
+    Returns:
+        dict | None: claims of the token or None if invalid or expired
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    token_data = verified_tokens.get(digest)
+    if token_data is not None:
+        return copy_claims(token_data)
     try:
         token_data = jwt.decode(
             jwt=token, key=Config.JWT_SECRET, algorithms=[Config.JWT_ALGORITHM]
         )
-        return token_data
     except jwt.PyJWTError as e:
-
-        logging.exception(e)
+        # client error, not worth a traceback per request
+        logging.warning("Token rejected: %s", e)
         return None
+    # tokens without exp are not cached, they would never leave the cache
+    if "exp" in token_data:
+        verified_tokens.set(digest, copy_claims(token_data), token_data["exp"])
+    return token_data
+
+
+def copy_claims(token_data: dict) -> dict:
+    # the claims are flat but for the "user" dict, cheaper than a deepcopy
+    claims = dict(token_data)
+    if isinstance(claims.get("user"), dict):
+        claims["user"] = dict(claims["user"])
+    return claims
 
 
 # creating safe url Serializer
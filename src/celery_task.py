@@ -1,17 +1,107 @@
-from asgiref.sync import async_to_sync
+import logging
+
+import redis
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from src.config import Config
+from src.smtp_pool import (
+    build_message,
+    close_smtp_session,
+    get_smtp_session,
+    open_smtp_session,
+)
 
-from src.mail import create_message, mail
+logger = logging.getLogger(__name__)
 
 c_app = Celery()
 c_app.config_from_object("src.config")
 
+# progress of a bulk mail job: hash of counters plus a capped list of failures
+MAIL_JOB_KEY = "mail_job:{}"
+MAIL_JOB_FAILURES_KEY = "mail_job:{}:failed"
+# the worker is sync, it gets its own sync client
+progress_redis = redis.Redis.from_url(Config.REDIS_URL)
+
+
+# every worker process opens its SMTP connection once and reuses it for all
+# the tasks it runs, instead of a TCP + TLS + AUTH handshake per message
+@worker_process_init.connect
+def connect_smtp(**kwargs):
+    open_smtp_session()
+
+
+@worker_process_shutdown.connect
+def disconnect_smtp(**kwargs):
+    close_smtp_session()
+
+
+@c_app.task()
+def send_mail(
+    recipients: list[str], subject: str, body: str, text: str | None = None
+):
+    get_smtp_session().send(build_message(recipients, subject, body, text))
+    logger.info("mail sent to %s", ", ".join(recipients))
+
+
+@c_app.task()
+def send_mail_batch(messages: list[dict]) -> list[str | None]:
+    """Sends many messages back to back over the process SMTP connection
+
+    Args:
+        messages (list[dict]): recipients, subject, body and optional text of
+            each message
+
+    Returns:
+        list[str | None]: per message None when sent or the error
+    """
+    return get_smtp_session().send_batch(
+        [
+            build_message(m["recipients"], m["subject"], m["body"], m.get("text"))
+            for m in messages
+        ]
+    )
+
 
 @c_app.task()
-def send_mail(recipients: list[str], subject: str, body: str):
-    message = create_message(recipients=recipients, subject=subject, body=body)
-    # celery not support any asyncIo task
-    # so if we needs to run asynchronous task/function inside celery needs
-    # to convert them into sync first
-    async_to_sync(mail.send_message)(message)
-    print("Email sent")
+def send_mail_chunk(
+    job_id: str,
+    recipients: list[str],
+    subject: str,
+    body: str,
+    text: str | None = None,
+):
+    """One chunk of a bulk mail job, one message per recipient
+
+    progress goes to the job hash, failures to its failure list (only the
+    first MAIL_JOB_MAX_FAILURES are kept, the count is always exact). The
+    chunk is always counted in chunks_done, or the job would never complete.
+    """
+    try:
+        errors = get_smtp_session().send_batch(
+            [
+                build_message([recipient], subject, body, text)
+                for recipient in recipients
+            ]
+        )
+    except Exception as e:
+        # send_batch reports per message SMTP errors itself, this is anything
+        # that broke the chunk as a whole (a bad message, a bug): all failed
+        logger.exception("mail job %s chunk failed", job_id)
+        errors = [str(e) or type(e).__name__] * len(recipients)
+    failures = [
+        f"{recipient}: {error}"
+        for recipient, error in zip(recipients, errors)
+        if error is not None
+    ]
+    key = MAIL_JOB_KEY.format(job_id)
+    failures_key = MAIL_JOB_FAILURES_KEY.format(job_id)
+    with progress_redis.pipeline() as pipe:
+        pipe.hincrby(key, "sent", len(recipients) - len(failures))
+        pipe.hincrby(key, "failed", len(failures))
+        pipe.hincrby(key, "chunks_done", 1)
+        if failures:
+            pipe.rpush(failures_key, *failures)
+            pipe.ltrim(failures_key, 0, Config.MAIL_JOB_MAX_FAILURES - 1)
+            pipe.expire(failures_key, Config.MAIL_JOB_TTL)
+        pipe.execute()
@@ -22,7 +22,94 @@ class Settings(BaseSettings):
     USE_CREDENTIALS: bool
     VALIDATE_CERTS: bool
     DOMAIN: str
+    # celery mail worker: one SMTP connection per process, reused across tasks
+    MAIL_SMTP_TIMEOUT: float = 30
+    # reconnect after this many messages, providers cap messages per connection
+    MAIL_SMTP_MAX_MESSAGES: int = 100
+    # NOOP before reusing a connection idle for longer than this
+    MAIL_SMTP_IDLE_SECONDS: float = 60
+    # provider rate limit per worker process, 0 disables it
+    MAIL_RATE_PER_SECOND: float = 0
+    MAIL_RATE_BURST: int = 10
+    # POST /send_mail: recipients per celery task, how long job progress is kept
+    MAIL_JOB_CHUNK_SIZE: int = 500
+    MAIL_JOB_TTL: int = 86400
+    MAIL_JOB_MAX_FAILURES: int = 1000
+    # recipients accepted by one POST /send_mail, send large lists as a plain
+    # text body to /send_mail/stream, it is not parsed in one piece
+    MAIL_JOB_MAX_RECIPIENTS: int = 100_000
     REDIS_URL: str = "redis://localhost:6379/0"
+    # bulk book import, rows per COPY and per-row errors kept in the report
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    # longer lines (or csv records) are rejected as row errors, not buffered
+    BULK_IMPORT_MAX_LINE_BYTES: int = 65536
+    # rows fetched per round trip by the streaming export
+    EXPORT_BATCH_SIZE: int = 1000
+    # verified jwt claims kept per worker
+    TOKEN_CACHE_SIZE: int = 10_000
+    # local copy of the token blacklist, "set" or "bloom"
+    REVOCATION_CACHE_BACKEND: str = "set"
+    # set: entries before falling back to redis, bloom: expected revocations
+    REVOCATION_CACHE_MAX_ENTRIES: int = 100_000
+    REVOCATION_BLOOM_FP_RATE: float = 0.001
+    REVOCATION_RESYNC_SECONDS: float = 60
+    # uid / role / is_verified snapshots used by get_current_user
+    USER_CACHE_TTL: int = 300
+    USER_CACHE_LOCAL_TTL: float = 30
+    USER_CACHE_LOCAL_SIZE: int = 10_000
+    # bcrypt runs in this many threads, more queued work is shed with 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    # serialized book responses, redis ttl and in-process tier
+    BOOK_CACHE_TTL: int = 300
+    BOOK_CACHE_LOCAL_TTL: float = 10
+    BOOK_CACHE_LOCAL_SIZE: int = 1000
+    # connection pool, per worker process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # read replicas, comma separated urls, empty means primary only
+    DATABASE_REPLICA_URLS: str = ""
+    # round_robin or least_connections
+    REPLICA_STRATEGY: str = "round_robin"
+    REPLICA_MAX_LAG_SECONDS: float = 5
+    REPLICA_HEALTH_CHECK_INTERVAL: float = 10
+    # reads of a user stay on the primary this long after their own write
+    READ_AFTER_WRITE_SECONDS: float = 5
+    # orjson responses and unvalidated serializers for trusted ORM output
+    FAST_JSON_RESPONSES: bool = False
+    # access log mode: all, sampled, slow or off
+    # sampled keeps ACCESS_LOG_SAMPLE_RATE of requests plus every 5xx and slow one
+    ACCESS_LOG_MODE: str = "all"
+    ACCESS_LOG_SAMPLE_RATE: float = 0.1
+    ACCESS_LOG_SLOW_MS: float = 500
+    ACCESS_LOG_QUEUE_SIZE: int = 10_000
+    # on-demand profiler, nothing is installed unless PROFILER_ENABLED
+    # a request is profiled when it carries a valid X-Profile header
+    # ("<unix ts>:<hex hmac-sha256 of ts with PROFILER_SECRET>") or is sampled
+    PROFILER_ENABLED: bool = False
+    PROFILER_SECRET: str = ""
+    PROFILER_SIGNATURE_TTL: int = 300
+    PROFILER_SAMPLE_RATE: float = 0.0
+    PROFILER_INTERVAL_MS: float = 1.0
+    PROFILER_OUTPUT_DIR: str = "profiles"
+    # prometheus metrics served on GET /metrics, per worker process. The scrape
+    # job sends METRICS_TOKEN as bearer token, empty leaves /metrics open
+    # (only behind a private network)
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: str = ""
+    # per request query count headers, QueryBudget checks and N+1 warnings
+    # (an identical statement run QUERY_REPEAT_THRESHOLD times or more)
+    QUERY_TRACKING_ENABLED: bool = False
+    QUERY_REPEAT_THRESHOLD: int = 3
+    # keyset pagination for the book catalog
+    BOOKS_PAGE_SIZE: int = 20
+    BOOKS_MAX_PAGE_SIZE: int = 100
+    # uids accepted by one POST /app1/batch
+    BOOKS_BATCH_MAX: int = 100
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -1,5 +1,6 @@
 # creating async Engine
 
+from fastapi import Request
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel, create_engine, text
@@ -9,11 +10,45 @@ from sqlmodel.ext.asyncio.session import (
 
 from src.config import Config
 
+from .pool import InstrumentedQueuePool
+from .replicas import ReplicaRouter, RoutingSession, remember_writer
+
 # sync
 # engine = create_engine(url=Config.DATABASE_URL, echo=True)
 
+
+def build_engine(url: str) -> AsyncEngine:
+    return AsyncEngine(
+        create_engine(
+            url=url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=Config.DB_POOL_PRE_PING,
+        )
+    )
+
+
 # async
-engine = AsyncEngine(create_engine(url=Config.DATABASE_URL))
+engine = build_engine(Config.DATABASE_URL)
+
+replica_urls = [url.strip() for url in Config.DATABASE_REPLICA_URLS.split(",")]
+replica_router = ReplicaRouter(
+    [build_engine(url) for url in replica_urls if url],
+    strategy=Config.REPLICA_STRATEGY,
+    max_lag=Config.REPLICA_MAX_LAG_SECONDS,
+    check_interval=Config.REPLICA_HEALTH_CHECK_INTERVAL,
+)
+
+# built once, every request only opens a session from it
+async_session = sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+)
 
 
 # this function used to open and hold up the connection through out the app
@@ -26,9 +61,26 @@ async def init_db():
         print("Something happen with database connection")
 
 
-async def get_session() -> AsyncSession:
+async def get_session(request: Request) -> AsyncSession:
+
+    async with async_session(info={"request": request}) as session:
+        try:
+            yield session
+        finally:
+            # runs before the response is sent, the user's next request
+            # already finds the mark
+            await remember_writer(session)
+
+
+def open_read_session(request: Request | None = None) -> AsyncSession:
+    """Session for reads, served by a replica when one is usable
+
+    use it directly where a dependency can not be, e.g. in a streamed body
+    """
+    return async_session(info={"request": request, "replica": replica_router.pick()})
+
 
-    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+async def get_read_session(request: Request) -> AsyncSession:
 
-    async with Session() as session:
+    async with open_read_session(request) as session:
         yield session
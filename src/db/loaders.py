@@ -0,0 +1,40 @@
+from enum import Enum
+
+from sqlalchemy.orm import raiseload, selectinload
+
+from .models import Book, User
+
+
+class UserLoad(str, Enum):
+    """How much of a user's library a query loads along with the user row"""
+
+    # single row, enough for auth checks
+    MINIMAL = "minimal"
+    # books and their reviews, what UserResponseModel serializes
+    WITH_BOOKS = "with_books"
+    FULL = "full"
+
+
+class BookLoad(str, Enum):
+    MINIMAL = "minimal"
+    WITH_REVIEWS = "with_reviews"
+
+
+# raiseload instead of noload: touching a relationship that was not asked for
+# fails loudly instead of silently serializing an empty list
+USER_LOAD_OPTIONS = {
+    UserLoad.MINIMAL: [raiseload(User.books), raiseload(User.reviews)],
+    UserLoad.WITH_BOOKS: [
+        selectinload(User.books).selectinload(Book.reviews),
+        raiseload(User.reviews),
+    ],
+    UserLoad.FULL: [
+        selectinload(User.books).selectinload(Book.reviews),
+        selectinload(User.reviews),
+    ],
+}
+
+BOOK_LOAD_OPTIONS = {
+    BookLoad.MINIMAL: [raiseload(Book.reviews)],
+    BookLoad.WITH_REVIEWS: [selectinload(Book.reviews)],
+}
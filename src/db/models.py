@@ -4,10 +4,12 @@ from typing import Optional
 
 # imports the PostgreSQL dialect for SQLAlchemy. This dialect provides PostgreSQL-specific functionality and types that are not part of the standard SQLAlchemy library.
 import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import Computed, func
 from sqlmodel import (
     TEXT,
     Column,
     Field,
+    Index,
     Relationship,
     SQLModel,
 )
@@ -22,7 +24,8 @@ class User(SQLModel, table=True):
         )
     )
     username: str
-    email: str
+    # looked up on every authenticated request
+    email: str = Field(unique=True, index=True)
     password_hash: str = Field(exclude=True)
     first_name: str
     last_name: str
@@ -58,6 +61,13 @@ sql model loads books here use lazy loading but it can problematic in asyn db ap
 class Book(SQLModel, table=True):
 
     __tablename__ = "books"
+    # backs the (created_at, uid) keyset pagination of the catalog
+    __table_args__ = (
+        Index("ix_books_created_at_uid", "created_at", "uid"),
+        # my_books pages and the User.books selectin load
+        Index("ix_books_user_uid_created_at_uid", "user_uid", "created_at", "uid"),
+        Index("ix_books_updated_at", "updated_at"),
+    )
 
     # Column is used to define a database column in SQLAlchemy. This is where you define the database schema for the uid field. as we are using sa_columns here so Column needs to use if we use SqlAlchamy columns instead SQLModel Directly
     # you use Field to specify additional arguments for database columns or validation in models.
@@ -77,8 +87,35 @@ class Book(SQLModel, table=True):
     user_uid: uuid.UUID | None = Field(
         default=None, foreign_key="users.uid", ondelete=""
     )
-    created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
-    updated_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
+    # part of every keyset cursor, a NULL would drop the row from the pages
+    created_at: datetime = Field(
+        sa_column=Column(
+            pg.TIMESTAMP,
+            nullable=False,
+            default=datetime.now,
+            server_default=func.now(),
+        )
+    )
+    # bumped on every update so incremental exports can filter on it
+    updated_at: datetime = Field(
+        sa_column=Column(pg.TIMESTAMP, default=datetime.now, onupdate=datetime.now)
+    )
+    # review aggregates, kept up to date by ReviewsService.add_reviews
+    review_count: int = Field(
+        sa_column=Column(pg.INTEGER, nullable=False, default=0, server_default="0")
+    )
+    rating_sum: int = Field(
+        sa_column=Column(pg.INTEGER, nullable=False, default=0, server_default="0")
+    )
+    # rating_histogram[r] counts reviews rated r (0-5), postgres index is r + 1
+    rating_histogram: list[int] = Field(
+        sa_column=Column(
+            pg.ARRAY(pg.INTEGER),
+            nullable=False,
+            default=lambda: [0] * 6,
+            server_default="{0,0,0,0,0,0}",
+        )
+    )
     # avoiding circular Import thats the reason not Importing User from models
     # needs to restructure
     user: User | None = Relationship(back_populates="books")
@@ -90,6 +127,25 @@ class Book(SQLModel, table=True):
         return f"<Book {self.title}>"
 
 
+# full text search document over title / author / publisher, generated by
+# postgres. Added to the table but not mapped on Book, so ORM queries never
+# fetch it, reference it as Book.__table__.c.search_vector
+# 'simple' config: no stemming or stop words, names and titles match as typed
+BOOK_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(publisher, '')), 'C')"
+)
+Book.__table__.append_column(
+    Column("search_vector", pg.TSVECTOR, Computed(BOOK_SEARCH_DOCUMENT, persisted=True))
+)
+Index(
+    "ix_books_search_vector",
+    Book.__table__.c.search_vector,
+    postgresql_using="gin",
+)
+
+
 class Review(SQLModel, table=True):
     __tablename__ = "reviews"
 
@@ -102,8 +158,8 @@ class Review(SQLModel, table=True):
             default=uuid.uuid4,
         )
     )
-    book_uid: uuid.UUID = Field(foreign_key="books.uid")
-    user_uid: uuid.UUID = Field(foreign_key="users.uid")
+    book_uid: uuid.UUID = Field(foreign_key="books.uid", index=True)
+    user_uid: uuid.UUID = Field(foreign_key="users.uid", index=True)
     review_text: str
     ratings: int = Field(le=5, ge=0)
     created_at: datetime = Field(sa_column=Column(pg.TIMESTAMP, default=datetime.now))
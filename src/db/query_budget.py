@@ -0,0 +1,198 @@
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import SQLModel
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import Config
+from src.db.db import engine
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """SQL work done on behalf of one request (or one track_queries block)
+
+    rows is what the request pulled into the ORM plus what its writes touched,
+    repeated() lists statements run more than once with the same SQL text,
+    the usual shape of an N+1 (a lazy load per parent row)
+    """
+
+    def __init__(self, budget: int | None = None) -> None:
+        self.budget = budget
+        self.count = 0
+        self.rows = 0
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str, rowcount: int) -> None:
+        self.count += 1
+        self.statements[statement] += 1
+        if rowcount > 0:
+            self.rows += rowcount
+
+    def merge(self, other: "QueryStats") -> None:
+        if other.budget is not None:
+            self.budget = (self.budget or 0) + other.budget
+        self.count += other.count
+        self.rows += other.rows
+        self.statements.update(other.statements)
+
+    def repeated(self, threshold: int = 2) -> dict[str, int]:
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries (budget {self.budget}), {self.rows} rows"]
+        for sql, n in sorted(self.repeated().items(), key=lambda item: -item[1]):
+            lines.append(f"  x{n}: {' '.join(sql.split())[:200]}")
+        return "\n".join(lines)
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    if stats is not None:
+        # rowcount is only meaningful for writes, reads are counted on load
+        is_write = context is not None and (
+            context.isinsert or context.isupdate or context.isdelete
+        )
+        stats.record(statement, cursor.rowcount if is_write else 0)
+
+
+def _on_load(target, context) -> None:
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.rows += 1
+
+
+_tracked_engines: set[int] = set()
+
+
+def install_query_tracking(engines: list[AsyncEngine]) -> None:
+    """Hooks the engines once, safe to call again (track_queries does)"""
+    for tracked in engines:
+        sync_engine = tracked.sync_engine
+        if id(sync_engine) in _tracked_engines:
+            continue
+        _tracked_engines.add(id(sync_engine))
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    if not event.contains(SQLModel, "load", _on_load):
+        event.listen(SQLModel, "load", _on_load, propagate=True)
+
+
+class QueryBudget:
+    """Declares how many statements a route is expected to run
+
+    add it to the route dependencies, going over it adds
+    X-Query-Budget-Exceeded to the response and logs the offending statements:
+        @router.get("/", dependencies=[Depends(QueryBudget(2))])
+    """
+
+    def __init__(self, max_queries: int) -> None:
+        self.max_queries = max_queries
+
+    # async so it runs in the request context, not a threadpool copy
+    async def __call__(self) -> None:
+        stats = current_query_stats.get()
+        if stats is not None:
+            # added up, a track_queries block around several requests gets
+            # the sum of their budgets
+            stats.budget = (stats.budget or 0) + self.max_queries
+
+
+class QueryBudgetMiddleware:
+    """Pure ASGI, counts the statements of each request
+
+    X-Query-Count / X-Query-Rows are set on every response, they count the
+    queries that ran before the response started (a streamed body keeps
+    querying after that)
+    """
+
+    def __init__(self, app: ASGIApp, repeat_threshold: int = 3) -> None:
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = current_query_stats.get()
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Query-Count"] = str(stats.count)
+                headers["X-Query-Rows"] = str(stats.rows)
+                if stats.over_budget:
+                    headers["X-Query-Budget-Exceeded"] = f"{stats.count}/{stats.budget}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            if parent is not None:
+                parent.merge(stats)
+            repeated = stats.repeated(self.repeat_threshold)
+            if stats.over_budget or repeated:
+                logger.warning(
+                    "%s %s over query budget or repeating statements: %s",
+                    scope["method"],
+                    scope["path"],
+                    stats.report(),
+                )
+
+
+@contextmanager
+def track_queries(
+    max_queries: int | None = None, engines: list[AsyncEngine] | None = None
+):
+    """This Function used to assert the query budget of a block, for tests
+
+    Args:
+        max_queries (int | None): fail when the block runs more statements,
+            defaults to the QueryBudget declared by the routes it called
+        engines (list[AsyncEngine] | None): engines to hook, default primary
+
+    Raises:
+        AssertionError: the block went over its budget
+
+    Yields:
+        QueryStats: statements seen so far, e.g.
+            with track_queries(4):
+                await client.get("/api/v1/user_auth/me", headers=auth)
+    """
+    install_query_tracking(engines or [engine])
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+    if max_queries is not None:
+        stats.budget = max_queries
+    if stats.over_budget:
+        raise AssertionError(stats.report())
+
+
+def install_query_budget(app: FastAPI, engines: list[AsyncEngine]) -> None:
+    install_query_tracking(engines)
+    app.add_middleware(
+        QueryBudgetMiddleware, repeat_threshold=Config.QUERY_REPEAT_THRESHOLD
+    )
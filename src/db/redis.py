@@ -1,20 +1,190 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable
+
 from redis import asyncio as aioredis
 
 from src.config import Config
 
+from .revocation import RevocationCache
+
+logger = logging.getLogger(__name__)
+
 JTI_EXPIRY = 3600
+# jti -> expiry timestamp, lets a worker resync without scanning the keyspace
+REVOKED_JTIS_KEY = "revoked_jtis"
+REVOKED_JTIS_CHANNEL = "revoked_jtis"
+SUBSCRIBER_RETRY_SECONDS = 1
+
+
+class InstrumentedRedis(aioredis.Redis):
+    """Redis client that reports (command, seconds, failed) of every command
+
+    listeners are plain callables appended to command_listeners, with none
+    registered a command costs one extra list check. A pipeline() is reported
+    once, as PIPELINE, when it is executed.
+    """
+
+    command_listeners: list[Callable[[str, float, bool], None]] = []
+
+    async def execute_command(self, *args, **options):
+        if not self.command_listeners:
+            return await super().execute_command(*args, **options)
+        return await report_command(
+            str(args[0]), super().execute_command(*args, **options)
+        )
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class InstrumentedPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        if not InstrumentedRedis.command_listeners:
+            return await super().execute(raise_on_error)
+        return await report_command("PIPELINE", super().execute(raise_on_error))
+
+
+async def report_command(command: str, awaitable: Awaitable):
+    start = time.perf_counter()
+    failed = True
+    try:
+        result = await awaitable
+        failed = False
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        for listener in InstrumentedRedis.command_listeners:
+            listener(command, elapsed, failed)
+
 
 # token_blacklist = aioredis.StrictRedis(
 #     host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=0
 # )
-token_blacklist = aioredis.from_url(Config.REDIS_URL)
+token_blacklist = InstrumentedRedis.from_url(Config.REDIS_URL)
+
+
+class RedisSubscriber:
+    """One pub/sub connection per worker that feeds in-process caches
+
+    on_sync callbacks run after every (re)subscribe and then every
+    resync_interval, on_reset callbacks run when the connection is lost so
+    caches stop trusting their local state
+    """
+
+    def __init__(self, client: aioredis.Redis, resync_interval: float) -> None:
+        self.client = client
+        self.resync_interval = resync_interval
+        self.handlers: dict[str, Callable[[str], None]] = {}
+        self.on_sync: list[Callable[[], Awaitable[None]]] = []
+        self.on_reset: list[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+
+    def subscribe(
+        self,
+        channel: str,
+        handler: Callable[[str], None],
+        on_sync: Callable[[], Awaitable[None]] | None = None,
+        on_reset: Callable[[], None] | None = None,
+    ) -> None:
+        self.handlers[channel] = handler
+        if on_sync is not None:
+            self.on_sync.append(on_sync)
+        if on_reset is not None:
+            self.on_reset.append(on_reset)
+
+    def ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _sync(self) -> None:
+        for callback in self.on_sync:
+            await callback()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    # subscribe before syncing so nothing published in between is lost
+                    await pubsub.subscribe(*self.handlers)
+                    await self._sync()
+                    synced_at = time.monotonic()
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0
+                        )
+                        if message is not None:
+                            channel = message["channel"].decode()
+                            self.handlers[channel](message["data"].decode())
+                        if time.monotonic() - synced_at >= self.resync_interval:
+                            await self._sync()
+                            synced_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("redis subscriber disconnected: %s", e)
+            finally:
+                for callback in self.on_reset:
+                    callback()
+            await asyncio.sleep(SUBSCRIBER_RETRY_SECONDS)
+
+
+subscriber = RedisSubscriber(
+    token_blacklist, resync_interval=Config.REVOCATION_RESYNC_SECONDS
+)
+revocation_cache = RevocationCache(
+    backend=Config.REVOCATION_CACHE_BACKEND,
+    max_entries=Config.REVOCATION_CACHE_MAX_ENTRIES,
+    fp_rate=Config.REVOCATION_BLOOM_FP_RATE,
+)
+
+
+def _on_revoked(data: str) -> None:
+    payload = json.loads(data)
+    revocation_cache.add(payload["jti"], payload["exp"])
+
+
+async def _resync_revocations() -> None:
+    now = time.time()
+    await token_blacklist.zremrangebyscore(REVOKED_JTIS_KEY, "-inf", now)
+    entries = await token_blacklist.zrangebyscore(
+        REVOKED_JTIS_KEY, now, "+inf", withscores=True
+    )
+    revocation_cache.replace([(jti.decode(), exp) for jti, exp in entries])
+
+
+def _reset_revocations() -> None:
+    revocation_cache.ready = False
+
+
+subscriber.subscribe(
+    REVOKED_JTIS_CHANNEL,
+    _on_revoked,
+    on_sync=_resync_revocations,
+    on_reset=_reset_revocations,
+)
 
 
 async def add_jit_to_blacklist(jti: str) -> None:
-    await token_blacklist.set(name=jti, value="", ex=JTI_EXPIRY)
+    expires_at = time.time() + JTI_EXPIRY
+    async with token_blacklist.pipeline(transaction=True) as pipe:
+        pipe.set(name=jti, value="", ex=JTI_EXPIRY)
+        pipe.zadd(REVOKED_JTIS_KEY, {jti: expires_at})
+        pipe.publish(REVOKED_JTIS_CHANNEL, json.dumps({"jti": jti, "exp": expires_at}))
+        await pipe.execute()
+    revocation_cache.add(jti, expires_at)
 
 
 async def token_in_blacklist(jti: str) -> bool:
+    subscriber.ensure_started()
+    revoked = revocation_cache.lookup(jti)
+    if revoked is not None:
+        return revoked
+    # local copy not trusted yet or bloom filter hit, ask redis
     jti = await token_blacklist.get(jti)
     return jti is not None
 
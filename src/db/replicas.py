@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import Delete, Insert, Update, event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import await_only
+from sqlmodel import Session
+
+from src.config import Config
+
+from .redis import token_blacklist
+
+logger = logging.getLogger(__name__)
+
+# replay lag in seconds, 0 when everything received is replayed (idle primary)
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+HEALTH_CHECK_TIMEOUT = 2
+RECENT_WRITER_KEY = "recent_writer:{}"
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        # unknown until the first health check passes, primary serves meanwhile
+        self.healthy = False
+        self.lag: float | None = None
+        self.checked_at = 0.0
+        event.listen(engine.sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect:
+            self.healthy = False
+
+    async def check(self) -> None:
+        try:
+            async with asyncio.timeout(HEALTH_CHECK_TIMEOUT):
+                async with self.engine.connect() as conn:
+                    result = await conn.execute(LAG_QUERY)
+                    self.lag = float(result.scalar() or 0)
+            self.healthy = True
+        except Exception as e:
+            logger.warning("replica %s unhealthy: %s", self.engine.url, e)
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    """Picks a healthy, caught up replica for read only sessions"""
+
+    def __init__(
+        self,
+        engines: list[AsyncEngine],
+        strategy: str = "round_robin",
+        max_lag: float = 5,
+        check_interval: float = 10,
+    ) -> None:
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"unknown replica strategy {strategy}")
+        self.replicas = [Replica(engine) for engine in engines]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+        self._checking: asyncio.Task | None = None
+
+    async def _check_all(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    def refresh(self) -> None:
+        """Starts a background health check when the last one is too old"""
+        if not self.replicas or (self._checking and not self._checking.done()):
+            return
+        now = time.monotonic()
+        if any(now - r.checked_at >= self.check_interval for r in self.replicas):
+            self._checking = asyncio.create_task(self._check_all())
+
+    def pick(self) -> AsyncEngine | None:
+        """This method used to choose the replica engine for one request
+
+        Returns:
+            AsyncEngine | None: replica engine or None to fall back to the primary
+        """
+        self.refresh()
+        candidates = [
+            r
+            for r in self.replicas
+            if r.healthy and r.lag is not None and r.lag <= self.max_lag
+        ]
+        if not candidates:
+            return None
+        if self.strategy == "least_connections":
+            replica = min(candidates, key=lambda r: r.engine.pool.checkedout())
+        else:
+            replica = candidates[next(self._counter) % len(candidates)]
+        return replica.engine
+
+    def lag_of(self, engine: AsyncEngine) -> float | None:
+        """Replay lag of the replica behind engine at its last health check"""
+        for replica in self.replicas:
+            if replica.engine is engine:
+                return replica.lag
+        return None
+
+
+class RecentWriters:
+    """uid of users that committed lately, their reads must see their own write
+
+    kept in redis with a TTL of window, so the next request of the user is
+    kept on the primary whichever worker or host it lands on. When redis can
+    not answer, reads go to the primary.
+    """
+
+    def __init__(self, client: aioredis.Redis, window: float) -> None:
+        self.client = client
+        self.window = window
+
+    async def mark(self, uid: str) -> None:
+        try:
+            await self.client.set(
+                RECENT_WRITER_KEY.format(uid), 1, px=int(self.window * 1000)
+            )
+        except RedisError as e:
+            logger.warning("could not mark %s as recent writer: %s", uid, e)
+
+    async def wrote_lately(self, uid: str | None) -> bool:
+        if uid is None:
+            return False
+        try:
+            return bool(await self.client.exists(RECENT_WRITER_KEY.format(uid)))
+        except RedisError as e:
+            logger.warning("recent writer check failed: %s", e)
+            return True
+
+
+def request_user_uid(request) -> str | None:
+    token_data = getattr(request.state, "token_data", None) if request else None
+    if not token_data:
+        return None
+    return token_data["user"]["uid"]
+
+
+class RoutingSession(Session):
+    """Session that sends reads to session.info["replica"] when one was picked
+
+    writes, flushes and users that just wrote always go to the primary
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if (
+            replica is not None
+            and not self._flushing
+            and not isinstance(clause, (Insert, Update, Delete))
+            and not self._wrote_lately()
+        ):
+            return replica.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    def _wrote_lately(self) -> bool:
+        # asked once per session and only when a replica was picked. get_bind
+        # runs inside sqlalchemy's greenlet, the redis call can be awaited
+        if "wrote_lately" not in self.info:
+            uid = request_user_uid(self.info.get("request"))
+            self.info["wrote_lately"] = await_only(recent_writers.wrote_lately(uid))
+        return self.info["wrote_lately"]
+
+
+recent_writers = RecentWriters(token_blacklist, window=Config.READ_AFTER_WRITE_SECONDS)
+
+
+# events are sync, the commit is only noted here and published to redis by
+# remember_writer when the request's session closes
+@event.listens_for(RoutingSession, "after_commit")
+def _note_commit(session: Session) -> None:
+    session.info["committed"] = True
+
+
+async def remember_writer(session) -> None:
+    """Marks the request's user as recent writer if the session committed"""
+    uid = request_user_uid(session.info.get("request"))
+    if session.info.get("committed") and uid is not None:
+        await recent_writers.mark(uid)
@@ -0,0 +1,91 @@
+import hashlib
+import math
+import time
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(fp_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+
+class RevocationCache:
+    """Worker local copy of the revoked jti list
+
+    lookup answers True / False when the local copy can be trusted and None
+    when the caller has to ask redis (not synced yet, subscriber down, bloom
+    filter hit, or more revocations than the memory bound allows)
+    """
+
+    def __init__(
+        self,
+        backend: str = "set",
+        max_entries: int = 100_000,
+        fp_rate: float = 0.001,
+    ) -> None:
+        if backend not in ("set", "bloom"):
+            raise ValueError(f"unknown revocation cache backend {backend}")
+        self.backend = backend
+        self.max_entries = max_entries
+        self.fp_rate = fp_rate
+        self.ready = False
+        self._expiry: dict[str, float] = {}
+        self._bloom = BloomFilter(max_entries, fp_rate)
+
+    def add(self, jti: str, expires_at: float) -> None:
+        if self.backend == "bloom":
+            self._bloom.add(jti)
+            return
+        self._expiry[jti] = expires_at
+        if len(self._expiry) > self.max_entries:
+            # over the memory bound, redis answers until the next resync
+            self._expiry.clear()
+            self.ready = False
+
+    def replace(self, entries: list[tuple[str, float]]) -> None:
+        """Rebuilds the local copy from a full resync, also drops expired jtis"""
+        if self.backend == "bloom":
+            bloom = BloomFilter(max(self.max_entries, len(entries)), self.fp_rate)
+            for jti, _ in entries:
+                bloom.add(jti)
+            self._bloom = bloom
+            self.ready = True
+            return
+        if len(entries) > self.max_entries:
+            self._expiry.clear()
+            self.ready = False
+            return
+        self._expiry = dict(entries)
+        self.ready = True
+
+    def lookup(self, jti: str) -> bool | None:
+        if not self.ready:
+            return None
+        if self.backend == "bloom":
+            # no false negatives, a hit may be a false positive
+            return False if jti not in self._bloom else None
+        expires_at = self._expiry.get(jti)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._expiry[jti]
+            return False
+        return True
@@ -40,6 +40,18 @@ class BookNotFoundException(BaseException):
     pass
 
 
+class InvalidCursorException(BaseException):
+    """Pagination cursor could not be decoded"""
+
+    pass
+
+
+class PasswordHasherBusyException(BaseException):
+    """Too many password hashes queued on this worker"""
+
+    pass
+
+
 class AccountNotVerified(BaseException):
     """Account not yet verified"""
 
@@ -47,11 +59,13 @@ class AccountNotVerified(BaseException):
 
 
 def create_exception_handler(
-    status_code: int, initial_details: Any
+    status_code: int, initial_details: Any, headers: dict | None = None
 ) -> Callable[[Request, Exception], JSONResponse]:
 
     async def exception_handler(request: Request, exc: BaseException):
-        return JSONResponse(content=initial_details, status_code=status_code)
+        return JSONResponse(
+            content=initial_details, status_code=status_code, headers=headers
+        )
 
     return exception_handler
 
@@ -70,6 +84,17 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    app.add_exception_handler(
+        InvalidTokenException,
+        create_exception_handler(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            initial_details={
+                "message": "Token is invalid or expired",
+                "error_code": "invalid_token",
+            },
+        ),
+    )
+
     app.add_exception_handler(
         BookNotFoundException,
         create_exception_handler(
@@ -81,6 +106,29 @@ def register_all_errors(app: FastAPI):
         ),
     )
 
+    app.add_exception_handler(
+        InvalidCursorException,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_details={
+                "message": "Invalid pagination cursor",
+                "error_code": "invalid_cursor",
+            },
+        ),
+    )
+
+    app.add_exception_handler(
+        PasswordHasherBusyException,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_details={
+                "message": "Server is busy, please try again",
+                "error_code": "server_busy",
+            },
+            headers={"Retry-After": "1"},
+        ),
+    )
+
     @app.exception_handler(500)
     async def internal_server_error(request, exc):
 
@@ -0,0 +1,55 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+
+from src.auth.dependencies import RoleChecker
+from src.config import Config
+from src.db.db import engine, replica_router
+from src.db.pool import pool_status
+from src.errors import InvalidTokenException
+from src.metrics import registry
+
+internal_router = APIRouter(tags=["Internal"], include_in_schema=False)
+# mounted at the root, scrapers expect /metrics
+metrics_router = APIRouter(tags=["Internal"], include_in_schema=False)
+admin_checker = RoleChecker(["admin"])
+
+
+def metrics_token_checker(request: Request) -> None:
+    """Prometheus can not log in, it sends the static METRICS_TOKEN instead"""
+    if not Config.METRICS_TOKEN:
+        return
+    expected = f"Bearer {Config.METRICS_TOKEN}".encode()
+    given = request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(given, expected):
+        raise InvalidTokenException()
+
+
+@internal_router.get("/db_pool", dependencies=[Depends(admin_checker)])
+async def get_db_pool_status() -> dict:
+    """Pool usage of the worker that served this request, use it to size DB_POOL_SIZE"""
+    return {
+        "primary": pool_status(engine.pool),
+        "replicas": [
+            {
+                "url": replica.engine.url.render_as_string(hide_password=True),
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag,
+                **pool_status(replica.engine.pool),
+            }
+            for replica in replica_router.replicas
+        ],
+    }
+
+
+@metrics_router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(metrics_token_checker)],
+)
+async def get_metrics() -> PlainTextResponse:
+    """Prometheus text format, counters of the worker that served the scrape"""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
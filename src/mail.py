@@ -1,10 +1,18 @@
 from pathlib import Path
 
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+from fastapi_mail import (
+    ConnectionConfig,
+    FastMail,
+    MessageSchema,
+    MessageType,
+    MultipartSubtypeEnum,
+)
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
 
 from src.config import Config
 
 BASE_DIR = Path(__file__).resolve().parent
+TEMPLATE_DIR = Path(BASE_DIR, "templates")
 
 
 # all these details should be replace by env
@@ -19,14 +27,79 @@ mail_config = ConnectionConfig(
     MAIL_SSL_TLS=False,
     USE_CREDENTIALS=True,
     VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(BASE_DIR, "templates"),
+    TEMPLATE_FOLDER=TEMPLATE_DIR,
 )
 
 mail = FastMail(config=mail_config)
 
 
-def create_message(recipients: list[str], subject: str, body: str):
-    message = MessageSchema(
-        recipients=recipients, subject=subject, body=body, subtype=MessageType.html
+def create_message(
+    recipients: list[str], subject: str, body: str, text: str | None = None
+):
+    if text is None:
+        return MessageSchema(
+            recipients=recipients, subject=subject, body=body, subtype=MessageType.html
+        )
+    # html part plus a plain text alternative for clients that do not render html
+    return MessageSchema(
+        recipients=recipients,
+        subject=subject,
+        body=body,
+        alternative_body=text,
+        subtype=MessageType.html,
+        multipart_subtype=MultipartSubtypeEnum.alternative,
     )
-    return message
+
+
+class MailTemplates:
+    """Every mail template compiled once, at import
+
+    FastMail's template_name path builds a new jinja Environment (and so
+    recompiles the template) per message, here the compiled templates are
+    kept and rendering is the only per message cost. Each mail is a pair,
+    <name>.html and <name>.txt for the plain text alternative.
+    """
+
+    SUBJECTS = {
+        "verify_email": "Verify your Email",
+        "password_reset": "Reset Your Password",
+        "welcome": "welcome to our app",
+    }
+
+    def __init__(self, folder: Path) -> None:
+        # html autoescaped, text as is, both fail loudly on a missing variable
+        self.html_env = Environment(
+            loader=FileSystemLoader(folder),
+            autoescape=True,
+            undefined=StrictUndefined,
+            auto_reload=False,
+        )
+        self.text_env = Environment(
+            loader=FileSystemLoader(folder),
+            autoescape=False,
+            undefined=StrictUndefined,
+            auto_reload=False,
+        )
+        self.compiled: dict[str, tuple[Template, Template]] = {
+            name: (
+                self.html_env.get_template(f"{name}.html"),
+                self.text_env.get_template(f"{name}.txt"),
+            )
+            for name in self.SUBJECTS
+        }
+
+    def render(self, name: str, **context) -> tuple[str, str, str]:
+        """This method used to render one mail from its compiled templates
+
+        Args:
+            name (str): template name, a key of SUBJECTS
+            **context: template variables
+
+        Returns:
+            tuple[str, str, str]: subject, html body and plain text body
+        """
+        html, text = self.compiled[name]
+        return self.SUBJECTS[name], html.render(context), text.render(context)
+
+
+mail_templates = MailTemplates(TEMPLATE_DIR)
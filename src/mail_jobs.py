@@ -0,0 +1,191 @@
+import asyncio
+import time
+import uuid
+from typing import AsyncIterator, Iterable
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+
+from src.celery_task import MAIL_JOB_FAILURES_KEY, MAIL_JOB_KEY, send_mail_chunk
+from src.config import Config
+from src.db.redis import token_blacklist
+
+EMAIL_ADAPTER = TypeAdapter(EmailStr)
+# an address is at most 254 characters, longer lines are rejected unbuffered
+MAIL_JOB_MAX_LINE_BYTES = 320
+
+
+class MailJob:
+    """Fans a bulk mail out to celery a chunk at a time as recipients come in
+
+    only the chunk being filled and the addresses seen so far (to send
+    duplicates once) are kept, every full chunk is published right away.
+    The job is "receiving" until close(), so it can not look completed while
+    chunks are still being dispatched.
+    """
+
+    def __init__(self, subject: str, body: str, text: str | None = None) -> None:
+        self.job_id = uuid.uuid4().hex
+        self.key = MAIL_JOB_KEY.format(self.job_id)
+        self.subject = subject
+        self.body = body
+        self.text = text
+        self.seen: set[str] = set()
+        self.chunk: list[str] = []
+        self.chunks = 0
+
+    @property
+    def recipients(self) -> int:
+        return len(self.seen)
+
+    async def open(self) -> None:
+        async with token_blacklist.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                self.key,
+                mapping={
+                    "total": 0,
+                    "chunks": 0,
+                    "sent": 0,
+                    "failed": 0,
+                    "chunks_done": 0,
+                    "receiving": 1,
+                    "created_at": int(time.time()),
+                },
+            )
+            pipe.expire(self.key, Config.MAIL_JOB_TTL)
+            await pipe.execute()
+
+    async def add(self, recipient: str) -> None:
+        if recipient in self.seen:
+            return
+        self.seen.add(recipient)
+        self.chunk.append(recipient)
+        if len(self.chunk) >= Config.MAIL_JOB_CHUNK_SIZE:
+            await self._dispatch()
+
+    async def _dispatch(self) -> None:
+        chunk, self.chunk = self.chunk, []
+        if not chunk:
+            return
+        self.chunks += 1
+        # counted before publishing so a fast chunk never finds its job short
+        async with token_blacklist.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self.key, "total", len(chunk))
+            pipe.hincrby(self.key, "chunks", 1)
+            await pipe.execute()
+        # publishing is blocking kombu I/O, it runs off the event loop
+        await asyncio.to_thread(
+            send_mail_chunk.apply_async,
+            (self.job_id, chunk, self.subject, self.body, self.text),
+        )
+
+    async def close(self) -> dict:
+        """Dispatches the last partial chunk, the job can complete from now on"""
+        await self._dispatch()
+        await token_blacklist.hset(self.key, "receiving", 0)
+        return {
+            "job_id": self.job_id,
+            "recipients": self.recipients,
+            "chunks": self.chunks,
+        }
+
+
+async def start_mail_job(
+    recipients: Iterable[str], subject: str, body: str, text: str | None = None
+) -> dict:
+    """This Function used to fan a bulk mail out to celery in bounded chunks
+
+    Args:
+        recipients (Iterable[str]): addresses, duplicates are sent once
+        subject (str): mail subject
+        body (str): html body
+        text (str | None): plain text alternative
+
+    Returns:
+        dict: job_id, recipients and chunks of the new job
+    """
+    job = MailJob(subject, body, text)
+    await job.open()
+    try:
+        for recipient in recipients:
+            await job.add(recipient)
+    finally:
+        summary = await job.close()
+    return summary
+
+
+async def stream_mail_job(
+    lines: AsyncIterator[bytes | None],
+    subject: str,
+    body: str,
+    text: str | None = None,
+) -> dict:
+    """This Function used to start a bulk mail from a stream of addresses
+
+    Args:
+        lines (AsyncIterator[bytes | None]): one address per line, as iter_lines
+            yields them (None for an oversized line)
+        subject (str): mail subject
+        body (str): html body
+        text (str | None): plain text alternative
+
+    Returns:
+        dict: job_id, recipients and chunks of the new job, the number of
+            rejected lines and the first MAIL_JOB_MAX_FAILURES of them
+    """
+    job = MailJob(subject, body, text)
+    await job.open()
+    rejected = 0
+    errors: list[dict] = []
+    try:
+        line_no = 0
+        async for raw in lines:
+            line_no += 1
+            if raw is None:
+                error = "line too long for an email address"
+            else:
+                address = raw.decode("utf-8", "replace").strip()
+                if not address:
+                    continue
+                if job.recipients >= Config.MAIL_JOB_MAX_RECIPIENTS:
+                    # the rest of the body is not read
+                    limit = Config.MAIL_JOB_MAX_RECIPIENTS
+                    rejected += 1
+                    errors.append(
+                        {"line": line_no, "error": f"more than {limit} recipients"}
+                    )
+                    break
+                try:
+                    await job.add(EMAIL_ADAPTER.validate_python(address))
+                    continue
+                except ValidationError:
+                    error = "not a valid email address"
+            rejected += 1
+            if len(errors) < Config.MAIL_JOB_MAX_FAILURES:
+                errors.append({"line": line_no, "error": error})
+    finally:
+        # chunks already published go out, an aborted upload still completes
+        summary = await job.close()
+    return {**summary, "rejected": rejected, "errors": errors}
+
+
+async def get_mail_job(job_id: str) -> dict | None:
+    """Progress of a job, None when it is unknown or expired"""
+    async with token_blacklist.pipeline(transaction=False) as pipe:
+        pipe.hgetall(MAIL_JOB_KEY.format(job_id))
+        pipe.lrange(MAIL_JOB_FAILURES_KEY.format(job_id), 0, -1)
+        fields, failures = await pipe.execute()
+    if not fields:
+        return None
+    job = {k.decode(): int(v) for k, v in fields.items()}
+    if job.get("receiving"):
+        status = "receiving"
+    elif job["chunks_done"] >= job["chunks"]:
+        status = "completed_with_errors" if job["failed"] else "completed"
+    else:
+        status = "in_progress" if job["chunks_done"] else "queued"
+    return {
+        "job_id": job_id,
+        "status": status,
+        **job,
+        "failures": [failure.decode() for failure in failures],
+    }
@@ -0,0 +1,257 @@
+import threading
+import time
+from bisect import bisect_left
+
+from celery.signals import after_task_publish
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.db.redis import InstrumentedRedis
+
+# Metrics are per process, with several uvicorn workers every scrape sees the
+# worker that answered it. Most updates happen on the event loop thread, but
+# celery publishes from asyncio.to_thread, so every thread updates its own
+# shard of a metric without any lock, a scrape sums the shards up.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Shards(threading.local):
+    """Values of one metric for the current thread
+
+    a shard is only ever written by its own thread, the list of all shards
+    outlives the threads so counts of a finished thread are not lost
+    """
+
+    def __init__(self, shards: list[dict]) -> None:
+        self.values: dict = {}
+        # list.append is atomic, readers copy the list before iterating
+        shards.append(self.values)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels=()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.shards: list[dict[tuple, float]] = []
+        self.local = _Shards(self.shards)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        values = self.local.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self):
+        values: dict[tuple, float] = {}
+        for shard in list(self.shards):
+            # dict.copy is atomic, iterating a shard being written is not
+            for labels, value in shard.copy().items():
+                values[labels] = values.get(labels, 0) + value
+        for labels, value in values.items():
+            yield self.name, _format_labels(self.label_names, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self.shards: list[dict[tuple, list[float]]] = []
+        self.local = _Shards(self.shards)
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        values = self.local.values
+        slots = values.get(labels)
+        if slots is None:
+            slots = values[labels] = [0] * (len(self.buckets) + 2)
+        slots[index] += 1
+        slots[-1] += value
+
+    def samples(self):
+        # a scrape racing an observation on another thread may count it in
+        # a bucket but not yet in the sum, the next scrape has both
+        values: dict[tuple, list[float]] = {}
+        for shard in list(self.shards):
+            for labels, slots in shard.copy().items():
+                total = values.setdefault(labels, [0] * len(slots))
+                for i, count in enumerate(list(slots)):
+                    total[i] += count
+        for labels, slots in values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), slots):
+                cumulative += count
+                label_text = _format_labels(self.label_names, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket", label_text, cumulative
+            label_text = _format_labels(self.label_names, labels)
+            yield f"{self.name}_count", label_text, cumulative
+            yield f"{self.name}_sum", label_text, slots[-1]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Counter | Histogram] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """This method used to build the Prometheus text exposition (0.0.4)
+
+        Returns:
+            str: body served by GET /metrics
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route template",
+        ["method", "route", "status"],
+    )
+)
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ["method", "route"],
+    )
+)
+http_in_flight = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests being served", ["method"])
+)
+db_queries = registry.register(
+    Counter(
+        "db_queries_total", "SQL statements executed", ["engine", "operation"]
+    )
+)
+db_query_duration = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "SQL statement latency",
+        ["engine", "operation"],
+        FAST_BUCKETS,
+    )
+)
+redis_command_duration = registry.register(
+    Histogram(
+        "redis_command_duration_seconds",
+        "Redis command latency",
+        ["command", "failed"],
+        FAST_BUCKETS,
+    )
+)
+celery_tasks_published = registry.register(
+    Counter("celery_tasks_published_total", "Celery tasks enqueued", ["task"])
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI, labels requests by route template (/books/{book_id})
+
+    the template comes from scope["route"] that FastAPI sets once the router
+    matched, requests that matched nothing share the "unmatched" label so
+    random paths can not blow up the label set
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        response = {"status": 500}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec(method)
+            route = scope.get("route")
+            template = getattr(route, "path_format", None) or "unmatched"
+            http_requests.inc(method, template, response["status"])
+            http_request_duration.observe(elapsed, method, template)
+
+
+def _track_queries(engine: AsyncEngine, name: str) -> None:
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        starts = conn.info.get("metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        db_queries.inc(name, operation)
+        db_query_duration.observe(elapsed, name, operation)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+def _on_redis_command(command: str, elapsed: float, failed: bool) -> None:
+    redis_command_duration.observe(elapsed, command.upper(), str(failed).lower())
+
+
+def _on_task_published(sender=None, **kwargs) -> None:
+    celery_tasks_published.inc(sender)
+
+
+def install_metrics(app: FastAPI, engine: AsyncEngine, replicas: list[AsyncEngine]):
+    """Adds the middleware and the SQL / redis / celery hooks"""
+    _track_queries(engine, "primary")
+    for replica in replicas:
+        _track_queries(replica, "replica")
+    InstrumentedRedis.command_listeners.append(_on_redis_command)
+    after_task_publish.connect(_on_task_published, weak=False)
+    app.add_middleware(MetricsMiddleware)
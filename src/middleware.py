@@ -1,34 +1,143 @@
+import atexit
+import json
 import logging
+import queue
+import random
+import sys
 import time
+from logging.handlers import QueueHandler, QueueListener
 
-from fastapi import FastAPI, status
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import (
     TrustedHostMiddleware,
 )
-from fastapi.requests import Request
-from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import Config
 
 logger = logging.getLogger("uvicorn.access")
 logger.disabled = True
 
 
+class JsonFormatter(logging.Formatter):
+    """Access records are dicts, they are encoded here on the listener thread"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, separators=(",", ":"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Never blocks the request: a full queue (slow log collector) drops the record"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLogMiddleware:
+    """Pure ASGI access log, one structured record per request
+
+    records go to a bounded queue that a background thread writes out, the
+    request path only times the request and enqueues a dict
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        handler: DroppingQueueHandler,
+        mode: str = "all",
+        sample_rate: float = 1.0,
+        slow_ms: float = 500,
+    ) -> None:
+        if mode not in ("all", "sampled", "slow"):
+            raise ValueError(f"unknown access log mode {mode}")
+        self.app = app
+        self.handler = handler
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    def should_log(self, status_code: int, duration_ms: float) -> bool:
+        if self.mode == "all":
+            return True
+        if duration_ms >= self.slow_ms:
+            return True
+        if self.mode == "slow":
+            return False
+        return status_code >= 500 or random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter_ns()
+        response = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter_ns() - start) / 1e6
+            if self.should_log(response["status"], duration_ms):
+                client = scope.get("client")
+                record = {
+                    "ts": time.time(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": response["status"],
+                    "duration_ms": round(duration_ms, 3),
+                    "bytes": response["bytes"],
+                    "client": client[0] if client else None,
+                }
+                self.handler.handle(
+                    logging.LogRecord(
+                        "access", logging.INFO, __file__, 0, record, None, None
+                    )
+                )
+
+
+def start_access_log() -> DroppingQueueHandler:
+    """Starts the writer thread, stopped (and flushed) at interpreter exit"""
+    log_queue = queue.Queue(maxsize=Config.ACCESS_LOG_QUEUE_SIZE)
+    # stderr, stdout stays free for what the process prints as its output
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return DroppingQueueHandler(log_queue)
+
+
 def register_middleware(app: FastAPI):
 
-    @app.middleware("http")
-    async def custom_logging(request: Request, call_next):
-        """
-        request is here incoming request pass to middle ware before the routers
-        next: i.e another middleware or path handler or routers
-        """
-        start_time = time.time()
-        # print("before", start_time)
-        response = await call_next(request)
-        processing_time = time.time() - start_time
-        message = f"{request.method} - {request.url.path} -{response.status_code} Before_process={start_time} - After_process={processing_time}"
-        # print("process_time", processing_time)
-        print(message)
-        return response
+    # replaces the print() based @app.middleware("http") custom_logging,
+    # BaseHTTPMiddleware and a blocking print on every request
+    if Config.ACCESS_LOG_MODE != "off":
+        app.add_middleware(
+            AccessLogMiddleware,
+            handler=start_access_log(),
+            mode=Config.ACCESS_LOG_MODE,
+            sample_rate=Config.ACCESS_LOG_SAMPLE_RATE,
+            slow_ms=Config.ACCESS_LOG_SLOW_MS,
+        )
 
     # we can not raise httpException in middleware
     # its an example
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config import Config
+from src.db.redis import InstrumentedRedis
+
+PROFILE_HEADER = b"x-profile"
+
+
+class StackSampler(threading.Thread):
+    """Samples the call stack of one thread (the event loop) at a fixed interval
+
+    the loop interleaves requests, so a sample may land in another request
+    that happens to run at that moment, read the result as "what the worker
+    did while this request was in flight"
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                module = frame.f_globals.get("__name__", "?")
+                stack.append(f"{module}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfile:
+    def __init__(self) -> None:
+        self.sql: list[dict] = []
+        self.redis: list[dict] = []
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "current_profile", default=None
+)
+
+
+def signature_valid(header: str, secret: str, ttl: int) -> bool:
+    try:
+        timestamp, signature = header.split(":", 1)
+        signed_at = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - signed_at) > ttl:
+        return False
+    expected = hmac.new(secret.encode(), timestamp.encode(), hashlib.sha256)
+    return hmac.compare_digest(expected.hexdigest(), signature)
+
+
+class ProfilerMiddleware:
+    """Profiles the requests that ask for it with a signed header, or a sample
+
+    writes <id>.folded (collapsed stacks for flamegraph.pl / speedscope) and
+    <id>.json (wall time, SQL and redis timings) to PROFILER_OUTPUT_DIR
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        output_dir: str,
+        secret: str = "",
+        signature_ttl: int = 300,
+        sample_rate: float = 0.0,
+        interval_ms: float = 1.0,
+    ) -> None:
+        self.app = app
+        self.output_dir = Path(output_dir)
+        self.secret = secret
+        self.signature_ttl = signature_ttl
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+
+    def wants_profile(self, scope: Scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if not self.secret:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return signature_valid(value.decode(), self.secret, self.signature_ttl)
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            wall = time.perf_counter() - start
+            sampler.stop()
+            current_profile.reset(token)
+            await asyncio.to_thread(self.write, scope, profile, sampler.stacks, wall)
+
+    def write(
+        self, scope: Scope, profile: RequestProfile, stacks: Counter, wall: float
+    ) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        name = f"{int(time.time())}_{scope['method']}_{path}_{uuid.uuid4().hex[:8]}"
+        folded = "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+        (self.output_dir / f"{name}.folded").write_text(folded)
+        summary = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "wall_ms": round(wall * 1000, 3),
+            "samples": sum(stacks.values()),
+            "sql_ms": round(sum(q["ms"] for q in profile.sql), 3),
+            "redis_ms": round(sum(c["ms"] for c in profile.redis), 3),
+            "sql": profile.sql,
+            "redis": profile.redis,
+        }
+        (self.output_dir / f"{name}.json").write_text(json.dumps(summary, indent=2))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is None or not conn.info.get("profile_query_start"):
+        return
+    elapsed = time.perf_counter() - conn.info["profile_query_start"].pop()
+    profile.sql.append({"statement": statement, "ms": round(elapsed * 1000, 3)})
+
+
+def _on_redis_command(command: str, elapsed: float, failed: bool) -> None:
+    profile = current_profile.get()
+    if profile is not None:
+        profile.redis.append(
+            {"command": command, "ms": round(elapsed * 1000, 3), "failed": failed}
+        )
+
+
+def install_profiler(app: FastAPI, engines: list[AsyncEngine]) -> None:
+    """Adds the middleware and the SQL / redis hooks, call only when enabled"""
+    for engine in engines:
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    InstrumentedRedis.command_listeners.append(_on_redis_command)
+    app.add_middleware(
+        ProfilerMiddleware,
+        output_dir=Config.PROFILER_OUTPUT_DIR,
+        secret=Config.PROFILER_SECRET,
+        signature_ttl=Config.PROFILER_SIGNATURE_TTL,
+        sample_rate=Config.PROFILER_SAMPLE_RATE,
+        interval_ms=Config.PROFILER_INTERVAL_MS,
+    )
@@ -0,0 +1,32 @@
+"""Maintenance commands for reviews
+
+    python -m src.reviews.cli reconcile-ratings
+"""
+import argparse
+import asyncio
+
+from src.db.db import async_session
+
+from .service import ReviewsService
+
+
+async def reconcile_ratings() -> int:
+    async with async_session() as session:
+        return await ReviewsService().reconcile_review_aggregates(session)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.reviews.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "reconcile-ratings",
+        help="recompute review_count / rating_sum / rating_histogram from reviews",
+    )
+    parser.parse_args()
+
+    fixed = asyncio.run(reconcile_ratings())
+    print(f"{fixed} books corrected")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,8 @@ from src.auth.dependencies import (
     RoleChecker,
     get_current_user,
 )
+from src.auth.schemas import UserSnapshot
 from src.db.db import get_session
-from src.db.models import User
 
 from .schemas import *
 from .service import ReviewsService
@@ -26,7 +26,7 @@ async def add_review_to_book(
     book_uid: str,
     review_data: ReviewCreateModel,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
 
     new_review = await review_service.add_reviews(
@@ -1,19 +1,63 @@
 from fastapi import status
 from fastapi.exceptions import HTTPException
+import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import bindparam, text, update
 from sqlmodel import desc, select
 from sqlmodel.ext.asyncio.session import (
     AsyncSession,
 )
 
+from src.app1.cache import book_cache
 from src.app1.service import BookService
 from src.auth.service import UserauthService
-from src.db.models import Review
+from src.db.loaders import BookLoad
+from src.db.models import Book, Review
 
 from .schemas import *
 
 book_service = BookService()
 auth_service = UserauthService()
 
+# the next batch of books by uid, locked: add_reviews bumps the aggregates
+# under the same row lock, so none of them can change until the batch commits
+LOCK_BOOKS_BATCH = text(
+    "SELECT uid FROM books WHERE uid > :after ORDER BY uid LIMIT :limit FOR UPDATE"
+)
+
+# recomputes the aggregates of the locked books that drifted from their
+# reviews. Run after LOCK_BOOKS_BATCH, in read committed the statement sees
+# every review committed before the lock was taken, and a review still in
+# flight adds itself on top once the lock is released.
+RECONCILE_REVIEW_AGGREGATES = text(
+    """
+    UPDATE books AS b
+    SET review_count = a.review_count,
+        rating_sum = a.rating_sum,
+        rating_histogram = a.rating_histogram
+    FROM (
+        SELECT books.uid,
+               count(reviews.uid) AS review_count,
+               coalesce(sum(reviews.ratings), 0) AS rating_sum,
+               ARRAY[
+                   count(*) FILTER (WHERE reviews.ratings = 0),
+                   count(*) FILTER (WHERE reviews.ratings = 1),
+                   count(*) FILTER (WHERE reviews.ratings = 2),
+                   count(*) FILTER (WHERE reviews.ratings = 3),
+                   count(*) FILTER (WHERE reviews.ratings = 4),
+                   count(*) FILTER (WHERE reviews.ratings = 5)
+               ]::integer[] AS rating_histogram
+        FROM books
+        LEFT JOIN reviews ON reviews.book_uid = books.uid
+        WHERE books.uid = ANY(:uids)
+        GROUP BY books.uid
+    ) AS a
+    WHERE b.uid = a.uid
+      AND (b.review_count, b.rating_sum, b.rating_histogram)
+          IS DISTINCT FROM (a.review_count, a.rating_sum, a.rating_histogram)
+    RETURNING b.uid, b.user_uid
+    """
+).bindparams(bindparam("uids", type_=pg.ARRAY(pg.UUID)))
+
 
 class ReviewsService:
 
@@ -25,7 +69,7 @@ class ReviewsService:
         session: AsyncSession,
     ) -> Review:
         try:
-            book = await book_service.get_book(book_uid, session)
+            book = await book_service.get_book(book_uid, session, BookLoad.MINIMAL)
             user = await auth_service.get_user_by_mail(user_email, session)
 
             if not book:
@@ -43,7 +87,22 @@ class ReviewsService:
             new_review.user_uid = user.uid
             new_review.book_uid = book.uid
             session.add(new_review)
+            # same transaction as the review, so the aggregates never drift
+            slot = Book.rating_histogram[new_review.ratings + 1]
+            await session.execute(
+                update(Book)
+                .where(Book.uid == book.uid)
+                .values(
+                    {
+                        Book.review_count: Book.review_count + 1,
+                        Book.rating_sum: Book.rating_sum + new_review.ratings,
+                        slot: slot + 1,
+                    }
+                )
+            )
             await session.commit()
+            # the review list is embedded in the book detail and list pages
+            await book_cache.invalidate_book(book.uid, book.user_uid)
             return new_review
 
         except Exception as e:
@@ -51,3 +110,37 @@ class ReviewsService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Some things went wrong",
             )
+
+    async def reconcile_review_aggregates(
+        self, session: AsyncSession, batch_size: int = 1000
+    ) -> int:
+        """This method used to backfill / repair the review aggregates of books
+
+        books are locked and fixed batch_size at a time, each batch in its own
+        transaction, so concurrent reviews wait for one batch at most
+
+        Args:
+            session (AsyncSession): Database Session
+            batch_size (int): books locked per transaction
+
+        Returns:
+            int: number of books whose aggregates were corrected
+        """
+        fixed = 0
+        # below every uuid4
+        after = uuid.UUID(int=0)
+        while True:
+            result = await session.execute(
+                LOCK_BOOKS_BATCH, {"after": after, "limit": batch_size}
+            )
+            uids = result.scalars().all()
+            if not uids:
+                await session.commit()
+                return fixed
+            result = await session.execute(RECONCILE_REVIEW_AGGREGATES, {"uids": uids})
+            corrected = result.all()
+            await session.commit()
+            for book_uid, user_uid in corrected:
+                await book_cache.invalidate_book(book_uid, user_uid)
+            fixed += len(corrected)
+            after = uids[-1]
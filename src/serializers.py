@@ -0,0 +1,80 @@
+import typing
+from functools import cache
+from types import UnionType
+
+import orjson
+from pydantic import BaseModel
+
+
+class ModelSerializer:
+    """Dumps trusted objects in the shape of a pydantic response model, unvalidated
+
+    The field list, nested serializers and computed fields of the model are
+    resolved once. Dumping then only reads attributes (or keys of a dict),
+    orjson takes care of uuid / date / datetime (asyncpg's uuid through
+    _json_default). Only use it for data that already satisfies the model,
+    e.g. ORM rows read from our own tables.
+    """
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        self.model = model
+        self.fields = [
+            (name, _nested_serializer(field.annotation))
+            for name, field in model.model_fields.items()
+            if not field.exclude
+        ]
+        # computed properties only read plain attributes, they run on the object
+        self.computed = [
+            (name, field.wrapped_property.fget)
+            for name, field in model.model_computed_fields.items()
+        ]
+
+    def dump(self, obj) -> dict:
+        if isinstance(obj, dict):
+            data = {name: obj.get(name) for name, _ in self.fields}
+        else:
+            data = {name: getattr(obj, name, None) for name, _ in self.fields}
+        for name, nested in self.fields:
+            value = data[name]
+            if nested is None or value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                data[name] = [nested.dump(item) for item in value]
+            else:
+                data[name] = nested.dump(value)
+        for name, fget in self.computed:
+            data[name] = fget(obj)
+        return data
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(self.dump(obj), default=_json_default)
+
+    def dumps_many(self, objs) -> bytes:
+        return orjson.dumps([self.dump(obj) for obj in objs], default=_json_default)
+
+
+def _json_default(value) -> str:
+    # asyncpg hands out its own asyncpg.pgproto.UUID, not a uuid.UUID subclass,
+    # orjson only knows the stdlib one. str() is the canonical uuid form.
+    if hasattr(value, "hex") and hasattr(value, "bytes"):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _nested_serializer(annotation) -> "ModelSerializer | None":
+    """Serializer of the model inside Model, list[Model] or Model | None"""
+    origin = typing.get_origin(annotation)
+    if origin in (list, tuple, typing.Union, UnionType):
+        for arg in typing.get_args(annotation):
+            nested = _nested_serializer(arg)
+            if nested is not None:
+                return nested
+        return None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return serializer_for(annotation)
+    return None
+
+
+@cache
+def serializer_for(model: type[BaseModel]) -> ModelSerializer:
+    return ModelSerializer(model)
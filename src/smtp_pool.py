@@ -0,0 +1,254 @@
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from email.message import EmailMessage
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+# 421: the server is closing the connection (often a per connection limit)
+SERVICE_CLOSING = 421
+
+
+class SMTPUnavailable(OSError):
+    """The server could not be reached or refused the handshake (TLS, AUTH)"""
+
+
+def connection_lost(error: Exception) -> bool:
+    """True when the connection is gone and the message deserves a retry on a
+    fresh one, anything else (refused recipient, bad message) is the message's
+    fault and is reported without touching the connection
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == SERVICE_CLOSING
+    return isinstance(
+        error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+    )
+
+
+class TokenBucket:
+    """rate messages per second on average, bursts of up to burst
+
+    per worker process, with N processes the provider sees up to N * rate
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            refill = (now - self.updated) * self.rate
+            self.tokens = min(self.burst, self.tokens + refill)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class SMTPSession:
+    """One long lived SMTP connection, reused for every message of the process
+
+    the handshake (TCP, TLS, AUTH) is paid once instead of once per message,
+    the connection is recycled after max_messages and checked with NOOP when
+    it sat idle, servers drop idle clients without telling them
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        starttls: bool,
+        ssl_tls: bool,
+        use_credentials: bool,
+        validate_certs: bool,
+        timeout: float,
+        max_messages: int,
+        idle_seconds: float,
+        rate_limiter: TokenBucket,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.ssl_tls = ssl_tls
+        self.use_credentials = use_credentials
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self.rate_limiter = rate_limiter
+        self.ssl_context = ssl.create_default_context()
+        if not validate_certs:
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.connection: smtplib.SMTP | None = None
+        self.sent_on_connection = 0
+        self.last_used = 0.0
+        # prefork runs one task per process, the lock is for --pool threads
+        self.lock = threading.Lock()
+
+    def connect(self) -> smtplib.SMTP:
+        connection = None
+        try:
+            if self.ssl_tls:
+                connection = smtplib.SMTP_SSL(
+                    self.host, self.port, timeout=self.timeout, context=self.ssl_context
+                )
+            else:
+                connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                if self.starttls:
+                    connection.starttls(context=self.ssl_context)
+            if self.use_credentials:
+                connection.login(self.username, self.password)
+        except (smtplib.SMTPException, OSError) as e:
+            if connection is not None:
+                connection.close()
+            raise SMTPUnavailable(
+                f"could not connect to {self.host}:{self.port}: {e}"
+            ) from e
+        self.connection = connection
+        self.sent_on_connection = 0
+        self.last_used = time.monotonic()
+        return connection
+
+    def close(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            self.connection.quit()
+        except (smtplib.SMTPException, OSError):
+            self.connection.close()
+        self.connection = None
+
+    def _usable_connection(self) -> smtplib.SMTP:
+        if self.connection is not None and self.sent_on_connection >= self.max_messages:
+            self.close()
+        if (
+            self.connection is not None
+            and time.monotonic() - self.last_used > self.idle_seconds
+        ):
+            try:
+                if self.connection.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        return self.connection or self.connect()
+
+    def _send(self, message: EmailMessage) -> None:
+        self.rate_limiter.acquire()
+        try:
+            self._usable_connection().send_message(message)
+        except (smtplib.SMTPException, OSError) as e:
+            if not connection_lost(e):
+                raise
+            logger.warning("smtp connection lost (%s), reconnecting", e)
+            self.close()
+            self.connect().send_message(message)
+        self.sent_on_connection += 1
+        self.last_used = time.monotonic()
+
+    def send(self, message: EmailMessage) -> None:
+        with self.lock:
+            self._send(message)
+
+    def send_batch(self, messages: list[EmailMessage]) -> list[str | None]:
+        """This method used to send many messages over the same connection
+
+        Args:
+            messages (list[EmailMessage]): messages, sent in order
+
+        Returns:
+            list[str | None]: per message None when sent or the error, one bad
+                message does not stop the rest of the batch, a server that
+                can not be connected to fails all the messages left
+        """
+        errors: list[str | None] = []
+        with self.lock:
+            for i, message in enumerate(messages):
+                try:
+                    self._send(message)
+                    errors.append(None)
+                except SMTPUnavailable as e:
+                    # every further message would wait for the timeout again
+                    left = len(messages) - i
+                    logger.error("smtp unavailable, %d messages failed: %s", left, e)
+                    errors.extend([str(e)] * left)
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.warning("mail to %s failed: %s", message["To"], e)
+                    errors.append(str(e) or type(e).__name__)
+        return errors
+
+
+def build_message(
+    recipients: list[str], subject: str, body: str, text: str | None = None
+) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = Config.MAIL_FROM
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    if text is None:
+        message.set_content(body, subtype="html")
+    else:
+        # multipart/alternative, plain text first so html is preferred
+        message.set_content(text)
+        message.add_alternative(body, subtype="html")
+    return message
+
+
+_session: SMTPSession | None = None
+_session_lock = threading.Lock()
+
+
+def get_smtp_session() -> SMTPSession:
+    """The process wide session, created on first use (or worker_process_init)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = SMTPSession(
+                host=Config.MAIL_SERVER,
+                port=Config.MAIL_PORT,
+                username=Config.MAIL_USERNAME,
+                password=Config.MAIL_PASSWORD,
+                starttls=Config.MAIL_STARTTLS,
+                ssl_tls=Config.MAIL_SSL_TLS,
+                use_credentials=Config.USE_CREDENTIALS,
+                validate_certs=Config.VALIDATE_CERTS,
+                timeout=Config.MAIL_SMTP_TIMEOUT,
+                max_messages=Config.MAIL_SMTP_MAX_MESSAGES,
+                idle_seconds=Config.MAIL_SMTP_IDLE_SECONDS,
+                rate_limiter=TokenBucket(
+                    Config.MAIL_RATE_PER_SECOND, Config.MAIL_RATE_BURST
+                ),
+            )
+        return _session
+
+
+def open_smtp_session() -> None:
+    """Connects ahead of the first task, a failure here is retried on first send"""
+    session = get_smtp_session()
+    try:
+        with session.lock:
+            session.connect()
+    except (smtplib.SMTPException, OSError) as e:
+        logger.warning("could not open smtp connection: %s", e)
+
+
+def close_smtp_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
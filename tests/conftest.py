@@ -0,0 +1,120 @@
+# tests run against a real, migrated Postgres (DATABASE_URL, its name must
+# contain "test" or "bench", it is emptied first) and skip without one
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+
+from benchmarks import _env  # noqa: F401
+from benchmarks.loadtest.fixtures import BenchData, reset_database, seed
+from src.db.db import async_session, engine
+from src.reviews.service import RECONCILE_REVIEW_AGGREGATES
+
+# big enough that the planner prefers an index whenever one applies, on a few
+# pages of rows a sequential scan is cheaper and EXPLAIN proves nothing
+USERS = 2000
+BOOKS_PER_USER = 5
+REVIEWS_PER_BOOK = 3
+TABLES = ("users", "books", "reviews")
+# the only book whose title matches a search, seeded titles all look alike
+SEARCH_TITLE = "Dune Messiah"
+
+# every book gets REVIEWS_PER_BOOK reviews by users spread over the table
+SEED_REVIEWS = text(
+    """
+    WITH u AS (SELECT uid, row_number() OVER (ORDER BY uid) AS n FROM users),
+         b AS (SELECT uid, row_number() OVER (ORDER BY uid) AS n FROM books)
+    INSERT INTO reviews
+        (uid, book_uid, user_uid, review_text, ratings, created_at, updated_at)
+    SELECT gen_random_uuid(), b.uid, u.uid, 'test review', (b.n + k) % 6,
+           now(), now()
+    FROM b
+    CROSS JOIN generate_series(1, :per_book) AS k
+    JOIN u ON u.n = (b.n + k * 7) % (SELECT count(*) FROM users) + 1
+    """
+)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def bench_data() -> BenchData:
+    """Migrated database with USERS users, their books and reviews"""
+
+    async def prepare() -> BenchData:
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            pytest.skip(f"no postgres at DATABASE_URL: {e}")
+        await reset_database()
+        data = await seed(USERS, BOOKS_PER_USER)
+        async with engine.begin() as conn:
+            await conn.execute(SEED_REVIEWS, {"per_book": REVIEWS_PER_BOOK})
+            await conn.execute(
+                text("UPDATE books SET title = :title WHERE uid = :uid"),
+                {"title": SEARCH_TITLE, "uid": data.book_uids[-1]},
+            )
+            uids = (await conn.execute(text("SELECT uid FROM books"))).scalars()
+            await conn.execute(RECONCILE_REVIEW_AGGREGATES, {"uids": uids.all()})
+        # as autovacuum would after a bulk load: fresh statistics, and the GIN
+        # pending list merged into the index (left pending, it makes a search
+        # costlier than a sequential scan). VACUUM can not run in a transaction
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM ANALYZE"))
+        return data
+
+    async def run() -> BenchData:
+        try:
+            return await prepare()
+        finally:
+            # pooled connections belong to this loop, every test has its own
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+async def db(bench_data: BenchData):
+    yield bench_data
+    await engine.dispose()
+
+
+@contextmanager
+def captured_statements():
+    statements: list[tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        # only ours, not what the dialect runs on a fresh connection
+        if any(f"FROM {table}" in statement for table in TABLES):
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+async def explain(statement: str, parameters: tuple) -> str:
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in result)
+
+
+@pytest.fixture
+def query_plans():
+    """Runs await call(session) and returns the EXPLAIN of every statement it ran"""
+
+    async def plans_of(call) -> list[str]:
+        with captured_statements() as statements:
+            async with async_session() as session:
+                await call(session)
+        return [await explain(statement, params) for statement, params in statements]
+
+    return plans_of
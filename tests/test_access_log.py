@@ -0,0 +1,114 @@
+"""AccessLogMiddleware records, its modes and the never blocking queue handler"""
+import json
+import logging
+import queue
+
+import httpx
+import pytest
+
+from src.middleware import AccessLogMiddleware, DroppingQueueHandler, JsonFormatter
+
+pytestmark = pytest.mark.anyio
+
+RECORD_FIELDS = {"ts", "method", "path", "status", "duration_ms", "bytes", "client"}
+
+
+async def plain_app(scope, receive, send):
+    status = 500 if scope["path"] == "/error" else 200
+    await send({"type": "http.response.start", "status": status, "headers": []})
+    await send({"type": "http.response.body", "body": b"hello", "more_body": True})
+    await send({"type": "http.response.body", "body": b" world"})
+
+
+def logged(log_queue: queue.Queue) -> list[dict]:
+    records = []
+    while not log_queue.empty():
+        records.append(log_queue.get_nowait().msg)
+    return records
+
+
+async def request(middleware: AccessLogMiddleware, path: str = "/books") -> None:
+    transport = httpx.ASGITransport(app=middleware, client=("10.0.0.1", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.get(path)
+
+
+async def test_record_fields():
+    log_queue = queue.Queue()
+    middleware = AccessLogMiddleware(plain_app, DroppingQueueHandler(log_queue))
+    await request(middleware, "/books")
+
+    [record] = logged(log_queue)
+    assert set(record) == RECORD_FIELDS
+    assert record["method"] == "GET"
+    assert record["path"] == "/books"
+    assert record["status"] == 200
+    # every body message is counted
+    assert record["bytes"] == len(b"hello world")
+    assert record["client"] == "10.0.0.1"
+    assert record["duration_ms"] >= 0
+
+
+async def test_record_is_json_encoded_by_the_formatter():
+    log_queue = queue.Queue()
+    middleware = AccessLogMiddleware(plain_app, DroppingQueueHandler(log_queue))
+    await request(middleware)
+
+    record = log_queue.get_nowait()
+    assert json.loads(JsonFormatter().format(record)) == record.msg
+
+
+@pytest.mark.parametrize(
+    "mode, sample_rate, slow_ms, path, expected",
+    [
+        ("all", 0.0, 500, "/books", True),
+        ("sampled", 0.0, 500, "/books", False),
+        ("sampled", 1.0, 500, "/books", True),
+        # every 5xx is kept whatever the sample rate
+        ("sampled", 0.0, 500, "/error", True),
+        # as is every slow request
+        ("sampled", 0.0, 0, "/books", True),
+        ("slow", 1.0, 500, "/books", False),
+        ("slow", 1.0, 500, "/error", False),
+        ("slow", 1.0, 0, "/books", True),
+    ],
+)
+async def test_modes(mode, sample_rate, slow_ms, path, expected):
+    log_queue = queue.Queue()
+    middleware = AccessLogMiddleware(
+        plain_app,
+        DroppingQueueHandler(log_queue),
+        mode=mode,
+        sample_rate=sample_rate,
+        slow_ms=slow_ms,
+    )
+    await request(middleware, path)
+    assert len(logged(log_queue)) == (1 if expected else 0)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        AccessLogMiddleware(plain_app, DroppingQueueHandler(queue.Queue()), "off")
+
+
+async def test_full_queue_drops_records():
+    log_queue = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(log_queue)
+    middleware = AccessLogMiddleware(plain_app, handler)
+    # a blocking put would hang the third request here
+    for _ in range(5):
+        await request(middleware)
+
+    assert log_queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_records_are_queued_unformatted():
+    log_queue = queue.Queue()
+    handler = DroppingQueueHandler(log_queue)
+    record = logging.LogRecord(
+        "access", logging.INFO, __file__, 0, {"path": "/"}, None, None
+    )
+    handler.handle(record)
+    # the dict goes to the listener thread as is, not as a formatted string
+    assert log_queue.get_nowait().msg == {"path": "/"}
@@ -0,0 +1,91 @@
+"""Only requests signed with PROFILER_SECRET (or sampled) are profiled"""
+import hashlib
+import hmac
+import json
+import time
+
+import httpx
+import pytest
+
+from src.profiling import PROFILE_HEADER, ProfilerMiddleware, signature_valid
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "profiler-secret"
+TTL = 300
+
+
+def sign(secret: str = SECRET, signed_at: float | None = None) -> str:
+    timestamp = str(int(time.time() if signed_at is None else signed_at))
+    signature = hmac.new(secret.encode(), timestamp.encode(), hashlib.sha256)
+    return f"{timestamp}:{signature.hexdigest()}"
+
+
+def scope_with(header: str | None = None) -> dict:
+    headers = [] if header is None else [(PROFILE_HEADER, header.encode())]
+    return {"type": "http", "method": "GET", "path": "/", "headers": headers}
+
+
+async def plain_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def test_signature_valid():
+    assert signature_valid(sign(), SECRET, TTL)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        sign("another-secret"),
+        sign(signed_at=time.time() - TTL - 60),
+        # a signature from the future is as old as one from the past
+        sign(signed_at=time.time() + TTL + 60),
+        sign().split(":")[0],
+        "not-a-timestamp:abc",
+        "",
+    ],
+    ids=["wrong secret", "expired", "future", "no signature", "garbage", "empty"],
+)
+def test_signature_rejected(header):
+    assert not signature_valid(header, SECRET, TTL)
+
+
+@pytest.mark.parametrize(
+    "secret, sample_rate, header, expected",
+    [
+        (SECRET, 0.0, sign(), True),
+        (SECRET, 0.0, None, False),
+        (SECRET, 0.0, sign("another-secret"), False),
+        # without a secret the header opens nothing
+        ("", 0.0, sign(""), False),
+        ("", 1.0, None, True),
+    ],
+)
+def test_wants_profile(secret, sample_rate, header, expected):
+    middleware = ProfilerMiddleware(
+        plain_app, "unused", secret=secret, signature_ttl=TTL, sample_rate=sample_rate
+    )
+    assert middleware.wants_profile(scope_with(header)) is expected
+
+
+async def test_signed_request_writes_profile(tmp_path):
+    middleware = ProfilerMiddleware(
+        plain_app, str(tmp_path), secret=SECRET, signature_ttl=TTL
+    )
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        response = await c.get("/books")
+        assert response.status_code == 200
+        assert list(tmp_path.iterdir()) == []
+
+        response = await c.get("/books", headers={"X-Profile": sign()})
+        assert response.status_code == 200
+
+    [summary] = tmp_path.glob("*.json")
+    assert len(list(tmp_path.glob("*.folded"))) == 1
+    profile = json.loads(summary.read_text())
+    assert profile["method"] == "GET"
+    assert profile["path"] == "/books"
+    assert profile["sql"] == [] and profile["redis"] == []
@@ -0,0 +1,89 @@
+"""QueryBudgetMiddleware headers and the warning of a route over its budget"""
+import logging
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlmodel import select
+
+from src.db.db import async_session, engine
+from src.db.loaders import USER_LOAD_OPTIONS, UserLoad
+from src.db.models import User
+from src.db.query_budget import (
+    QueryBudget,
+    QueryBudgetMiddleware,
+    install_query_tracking,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def run_selects(n: int) -> None:
+    async with engine.connect() as conn:
+        for _ in range(n):
+            await conn.execute(text("SELECT 1 FROM users LIMIT 1"))
+
+
+def budget_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/unbudgeted")
+    async def unbudgeted():
+        await run_selects(2)
+
+    @app.get("/within", dependencies=[Depends(QueryBudget(2))])
+    async def within():
+        await run_selects(2)
+
+    @app.get("/over", dependencies=[Depends(QueryBudget(1))])
+    async def over():
+        await run_selects(3)
+
+    @app.get("/users", dependencies=[Depends(QueryBudget(1))])
+    async def users():
+        async with async_session() as session:
+            options = USER_LOAD_OPTIONS[UserLoad.MINIMAL]
+            await session.exec(select(User).options(*options).limit(3))
+
+    app.add_middleware(QueryBudgetMiddleware, repeat_threshold=3)
+    install_query_tracking([engine])
+    return app
+
+
+@pytest.fixture
+async def client(db):
+    transport = httpx.ASGITransport(app=budget_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+async def test_count_header_without_budget(client):
+    response = await client.get("/unbudgeted")
+    assert response.headers["X-Query-Count"] == "2"
+    assert response.headers["X-Query-Rows"] == "0"
+    assert "X-Query-Budget-Exceeded" not in response.headers
+
+
+async def test_within_budget(client, caplog):
+    with caplog.at_level(logging.WARNING, logger="src.db.query_budget"):
+        response = await client.get("/within")
+    assert response.headers["X-Query-Count"] == "2"
+    assert "X-Query-Budget-Exceeded" not in response.headers
+    assert caplog.records == []
+
+
+async def test_over_budget(client, caplog):
+    with caplog.at_level(logging.WARNING, logger="src.db.query_budget"):
+        response = await client.get("/over")
+    assert response.headers["X-Query-Count"] == "3"
+    assert response.headers["X-Query-Budget-Exceeded"] == "3/1"
+    # the repeated statement is named in the warning
+    [record] = caplog.records
+    assert "x3: SELECT 1 FROM users LIMIT 1" in record.getMessage()
+
+
+async def test_rows_header_counts_loaded_objects(client):
+    response = await client.get("/users")
+    assert response.headers["X-Query-Count"] == "1"
+    assert response.headers["X-Query-Rows"] == "3"
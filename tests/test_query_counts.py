@@ -0,0 +1,226 @@
+"""Statements run by each load profile and by the routes built on them
+
+a relationship added to a profile, or a lazy load slipping into a route,
+shows up here as a changed count before it shows up as an N+1 in production
+"""
+import uuid
+
+import httpx
+import pytest
+
+from benchmarks.loadtest.fixtures import PASSWORD, use_fakeredis
+from benchmarks.loadtest.scenarios import API
+from src import app
+from src.app1.cache import book_cache
+from src.app1.service import BookService
+from src.auth.cache import user_snapshots
+from src.auth.service import UserauthService
+from src.db import redis as redis_module
+from src.db.db import async_session
+from src.db.loaders import BookLoad, UserLoad
+from src.db.query_budget import track_queries
+
+pytestmark = pytest.mark.anyio
+
+auth_service = UserauthService()
+book_service = BookService()
+
+
+@pytest.fixture
+async def client(db):
+    pytest.importorskip("fakeredis")
+    use_fakeredis()
+    # every test starts with cold caches
+    await redis_module.token_blacklist.flushall()
+    user_snapshots.local.clear()
+    book_cache.local.clear()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+def auth(db) -> dict:
+    return {"Authorization": f"Bearer {db.tokens[0]}"}
+
+
+async def warm_snapshot(client, db) -> None:
+    """Caches the caller's UserSnapshot, role checks then cost no statement"""
+    response = await client.get(f"{API}/user_auth/me", headers=auth(db))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "load, expected",
+    [
+        (UserLoad.MINIMAL, 1),
+        # user, books, the books' reviews
+        (UserLoad.WITH_BOOKS, 3),
+        (UserLoad.FULL, 4),
+    ],
+)
+async def test_user_load_profiles(db, load, expected):
+    async with async_session() as session:
+        with track_queries() as stats:
+            user = await auth_service.get_user_by_mail(db.emails[0], session, load)
+    assert user is not None
+    assert stats.count == expected, stats.report()
+
+
+@pytest.mark.parametrize(
+    "load, expected", [(BookLoad.MINIMAL, 1), (BookLoad.WITH_REVIEWS, 2)]
+)
+async def test_book_load_profiles(db, load, expected):
+    book_uid = uuid.UUID(db.book_uids[0])
+    async with async_session() as session:
+        with track_queries() as stats:
+            book = await book_service.get_book(book_uid, session, load)
+    assert book is not None
+    assert stats.count == expected, stats.report()
+
+
+async def test_books_by_ids_is_one_query(db):
+    book_uids = [uuid.UUID(uid) for uid in db.book_uids[:20]]
+    async with async_session() as session:
+        with track_queries(1):
+            found = await book_service.get_books_by_ids(book_uids, session)
+    assert len(found) == len(book_uids)
+
+
+# without max_queries track_queries holds the routes to their QueryBudget
+
+
+async def test_me_queries(client, db):
+    with track_queries() as stats:
+        response = await client.get(f"{API}/user_auth/me", headers=auth(db))
+    assert response.status_code == 200
+    # snapshot miss (UserLoad.MINIMAL) then UserLoad.WITH_BOOKS
+    assert stats.count == 4, stats.report()
+
+    with track_queries() as stats:
+        response = await client.get(f"{API}/user_auth/me", headers=auth(db))
+    assert response.status_code == 200
+    # the snapshot is cached now
+    assert stats.count == 3, stats.report()
+
+
+async def test_list_queries(client, db):
+    with track_queries() as stats:
+        response = await client.get(f"{API}/app1/", headers=auth(db))
+    assert response.status_code == 200
+    assert stats.count == 1, stats.report()
+
+    with track_queries() as stats:
+        response = await client.get(
+            f"{API}/app1/",
+            params={"cursor": response.json()["next_cursor"]},
+            headers=auth(db),
+        )
+    assert response.status_code == 200
+    assert stats.count == 1, stats.report()
+
+    # served from the response cache
+    with track_queries(0):
+        response = await client.get(f"{API}/app1/", headers=auth(db))
+    assert response.status_code == 200
+
+
+async def test_detail_queries(client, db):
+    path = f"{API}/app1/{db.book_uids[0]}"
+    with track_queries() as stats:
+        response = await client.get(path, headers=auth(db))
+    assert response.status_code == 200
+    # the book, then its reviews (BookLoad.WITH_REVIEWS)
+    assert stats.count == 2, stats.report()
+
+    with track_queries(0):
+        response = await client.get(path, headers=auth(db))
+    assert response.status_code == 200
+
+
+async def test_my_books_queries(client, db):
+    with track_queries() as stats:
+        response = await client.get(
+            f"{API}/app1/my_books", params={"limit": 2}, headers=auth(db)
+        )
+    assert response.status_code == 200
+    assert stats.count == 1, stats.report()
+
+    with track_queries() as stats:
+        response = await client.get(
+            f"{API}/app1/my_books",
+            params={"limit": 2, "cursor": response.json()["next_cursor"]},
+            headers=auth(db),
+        )
+    assert response.status_code == 200
+    assert stats.count == 1, stats.report()
+
+
+async def test_search_queries(client, db):
+    with track_queries() as stats:
+        response = await client.get(
+            f"{API}/app1/search", params={"q": "bench"}, headers=auth(db)
+        )
+    assert response.status_code == 200
+    assert stats.count == 1, stats.report()
+
+
+@pytest.mark.parametrize("include_reviews, expected", [(False, 1), (True, 2)])
+async def test_batch_queries(client, db, include_reviews, expected):
+    body = {"ids": db.book_uids[:20], "include_reviews": include_reviews}
+    with track_queries() as stats:
+        response = await client.post(f"{API}/app1/batch", json=body, headers=auth(db))
+    assert response.status_code == 200
+    assert stats.count == expected, stats.report()
+
+
+async def test_book_write_queries(client, db):
+    await warm_snapshot(client, db)
+    book = {
+        "title": "Counted",
+        "author": "Test Author",
+        "publisher": "Test Press",
+        "published_date": "2020-01-01",
+        "page_count": 10,
+        "language": "en",
+    }
+    with track_queries() as stats:
+        response = await client.post(f"{API}/app1/", json=book, headers=auth(db))
+    assert response.status_code == 201
+    # INSERT ... RETURNING, server defaults come back with it
+    assert stats.count == 1, stats.report()
+    path = f"{API}/app1/{response.json()['uid']}"
+
+    del book["published_date"]
+    book["title"] = "Counted again"
+    with track_queries() as stats:
+        response = await client.patch(path, json=book, headers=auth(db))
+    assert response.status_code == 200
+    # the book (BookLoad.MINIMAL), then the UPDATE
+    assert stats.count == 2, stats.report()
+
+    with track_queries() as stats:
+        response = await client.delete(path, headers=auth(db))
+    assert response.status_code == 204
+    # the book and its (no) reviews, then the DELETE
+    assert stats.count == 3, stats.report()
+
+
+async def test_add_review_queries(client, db):
+    await warm_snapshot(client, db)
+    review = {"review_text": "counted", "ratings": 4}
+    with track_queries() as stats:
+        response = await client.post(
+            f"{API}/reviews/book/{db.book_uids[1]}", json=review, headers=auth(db)
+        )
+    assert response.status_code == 200
+    # book and user (both minimal), the review INSERT, the aggregates UPDATE
+    assert stats.count == 4, stats.report()
+
+
+async def test_login_queries(client, db):
+    credentials = {"email": db.emails[0], "password": PASSWORD}
+    with track_queries() as stats:
+        response = await client.post(f"{API}/user_auth/login", json=credentials)
+    assert response.status_code == 200
+    # the user row only, UserLoad.MINIMAL raiseloads books and reviews
+    assert stats.count == 1, stats.report()
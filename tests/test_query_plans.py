@@ -0,0 +1,101 @@
+"""The lookups behind login, /me, the book pages and reviews use their indexes
+
+every statement a service call runs is captured and EXPLAINed on the seeded
+database (see conftest, sized so a sequential scan is never the cheap plan)
+"""
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from src.app1.service import BookService
+from src.auth.service import UserauthService
+from src.db.db import engine
+from src.db.loaders import BookLoad, UserLoad
+
+pytestmark = pytest.mark.anyio
+
+auth_service = UserauthService()
+book_service = BookService()
+
+
+# uid is both the primary key and a unique constraint, either index will do
+BOOK_UID_INDEXES = ("books_pkey", "books_uid_key")
+
+
+def assert_uses_index(plan: str, *indexes: str) -> None:
+    assert "Seq Scan" not in plan, plan
+    assert any(index in plan for index in indexes), plan
+
+
+async def test_user_by_email_uses_unique_index(db, query_plans):
+    async def call(session):
+        await auth_service.get_user_by_mail(db.emails[-1], session)
+
+    plans = await query_plans(call)
+    assert len(plans) == 1
+    assert_uses_index(plans[0], "ix_users_email")
+
+
+async def test_user_reviews_use_user_uid_index(db, query_plans):
+    async def call(session):
+        await auth_service.get_user_by_mail(db.emails[0], session, UserLoad.FULL)
+
+    # the user first, then its books, the books' reviews and the user's
+    # reviews in whatever order the selectin loaders run
+    users, *related = await query_plans(call)
+    assert_uses_index(users, "ix_users_email")
+    assert len(related) == 3
+    for index in (
+        "ix_books_user_uid_created_at_uid",
+        "ix_reviews_book_uid",
+        "ix_reviews_user_uid",
+    ):
+        plan = next((plan for plan in related if index in plan), "")
+        assert_uses_index(plan, index)
+
+
+async def test_book_reviews_use_book_uid_index(db, query_plans):
+    async def call(session):
+        book_uid = uuid.UUID(db.book_uids[0])
+        await book_service.get_book(book_uid, session, BookLoad.WITH_REVIEWS)
+
+    book, reviews = await query_plans(call)
+    assert_uses_index(book, *BOOK_UID_INDEXES)
+    assert_uses_index(reviews, "ix_reviews_book_uid")
+
+
+async def test_books_by_ids_uses_primary_key(db, query_plans):
+    async def call(session):
+        book_uids = [uuid.UUID(uid) for uid in db.book_uids[:20]]
+        await book_service.get_books_by_ids(book_uids, session)
+
+    plans = await query_plans(call)
+    assert len(plans) == 1
+    assert_uses_index(plans[0], *BOOK_UID_INDEXES)
+
+
+async def test_list_uses_keyset_index(db, query_plans):
+    async def call(session):
+        page = await book_service.get_all_books(session, 10)
+        await book_service.get_all_books(session, 10, page["next_cursor"])
+
+    plans = await query_plans(call)
+    assert len(plans) == 2
+    for plan in plans:
+        assert_uses_index(plan, "ix_books_created_at_uid")
+
+
+async def test_my_books_uses_owner_index(db, query_plans):
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT user_uid FROM books LIMIT 1"))
+        owner = result.scalar()
+
+    async def call(session):
+        page = await book_service.get_won_books(owner, session, 2)
+        await book_service.get_won_books(owner, session, 2, page["next_cursor"])
+
+    plans = await query_plans(call)
+    assert len(plans) == 2
+    for plan in plans:
+        assert_uses_index(plan, "ix_books_user_uid_created_at_uid")
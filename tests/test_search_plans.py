@@ -0,0 +1,20 @@
+"""Full text search is answered by the GIN index on books.search_vector"""
+import pytest
+
+from src.app1.service import BookService
+
+pytestmark = pytest.mark.anyio
+
+book_service = BookService()
+
+
+async def test_search_uses_gin_index(db, query_plans):
+    async def call(session):
+        # prefix match on the last term, as typed in a search box
+        page = await book_service.search_books("dune mes", session, 10)
+        assert [book.title for book in page["items"]] == ["Dune Messiah"]
+
+    plans = await query_plans(call)
+    assert len(plans) == 1
+    assert "Seq Scan" not in plans[0], plans[0]
+    assert "ix_books_search_vector" in plans[0], plans[0]